@@ -0,0 +1,113 @@
+"""Micro-benchmark: per-call overhead of synchronous ``LLM.inference``.
+
+Compares the old pattern, where every call ran on a new event loop
+(``asyncio.run``, with its own default executor), with submitting to the
+long-lived background loop. Two modes:
+
+``cached``
+    Every call is a response-cache hit, so no request is sent and the
+    numbers are pure dispatch overhead.
+``client``
+    The response cache is off and each call goes through the Azure OpenAI
+    client and the rate limiter. The old pattern also built a new client
+    per call, the background loop reuses its pooled one. The HTTP
+    transport is mocked to answer at once with a short streamed
+    completion, so nothing leaves the machine.
+
+Run it from the project root (where `config.yaml` lives):
+
+    $ python -m benchmarks.bench_llm_inference [cached|client] [iterations]
+"""
+import asyncio
+import json
+import sys
+import time
+
+import httpx
+
+from src.llm import LLM
+from src.llm.azure_openai_client import AzureOpenAI
+from src.llm.rate_limiter import RateLimiter
+
+# No project: its token total is a SQLite write both paths would pay the same
+PROJECT = None
+PROMPT = "benchmark prompt"
+
+
+def _completion(request: httpx.Request) -> httpx.Response:
+    chunk = {
+        "id": "bench", "object": "chat.completion.chunk", "created": 0, "model": "gpt-4o",
+        "choices": [{"index": 0, "delta": {"role": "assistant", "content": "benchmark response"},
+                     "finish_reason": "stop"}],
+    }
+    usage = {**chunk, "choices": [], "usage": {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5}}
+    body = f"data: {json.dumps(chunk)}\n\ndata: {json.dumps(usage)}\n\ndata: [DONE]\n\n"
+    return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=body.encode("utf-8"))
+
+
+class _MockedAsyncClient(httpx.AsyncClient):
+    def __init__(self, **kwargs):
+        super().__init__(transport=httpx.MockTransport(_completion), **kwargs)
+
+
+async def _call_with_fresh_client(llm: LLM) -> str:
+    # Nothing pooled may outlive the loop it was created on
+    AzureOpenAI._clients.clear()
+    AzureOpenAI._in_flight.clear()
+    try:
+        return await llm._ainference(PROMPT, PROJECT)
+    finally:
+        await AzureOpenAI.aclose()
+
+
+def per_call_loop(llm: LLM, iterations: int, fresh_client: bool = False) -> float:
+    """Old behaviour: a new event loop for every call, and a new client with *fresh_client*."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        asyncio.run(_call_with_fresh_client(llm) if fresh_client else llm._ainference(PROMPT, PROJECT))
+    return time.perf_counter() - start
+
+
+def background_loop(llm: LLM, iterations: int) -> float:
+    """New behaviour: calls are submitted to the shared background loop and reuse its client."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        llm.inference(PROMPT, PROJECT)
+    return time.perf_counter() - start
+
+
+def main():
+    mode = sys.argv[1] if len(sys.argv) > 1 else "cached"
+    if mode not in ("cached", "client"):
+        raise SystemExit(f"Unknown mode {mode!r}, expected cached or client")
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else (1000 if mode == "cached" else 200)
+    # Every client AzureOpenAI builds answers from _completion
+    httpx.AsyncClient = _MockedAsyncClient
+    # Keep the limiter in the path but out of the timings
+    LLM._rate_limiter = RateLimiter(requests_per_minute=10 ** 9, tokens_per_minute=10 ** 12, burst_size=10 ** 6)
+    llm = LLM(model_id="gpt-4o")
+    llm.use_semantic_cache = False
+    if mode == "cached":
+        llm.use_cache = True
+        key = LLM._cache.key(llm.model_id, PROMPT, llm.generation_params)
+        LLM._cache.put(key, llm.model_id, "cached response")
+    else:
+        llm.use_cache = False
+    fresh_client = mode == "client"
+
+    # Warm up both paths
+    per_call_loop(llm, 10, fresh_client)
+    background_loop(llm, 10)
+
+    before = per_call_loop(llm, iterations, fresh_client)
+    after = background_loop(llm, iterations)
+
+    print(f"mode:               {mode}")
+    print(f"iterations:         {iterations}")
+    print(f"asyncio.run:        {before / iterations * 1e6:10.1f} us/call")
+    print(f"background loop:    {after / iterations * 1e6:10.1f} us/call")
+    print(f"speedup:            {before / after:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
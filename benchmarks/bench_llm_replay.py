@@ -0,0 +1,64 @@
+"""Benchmark: our own overhead around an LLM call, with the model replayed offline.
+
+Responses are served from a temporary cassette (see ``llm_replay`` in
+`config.yaml`) with the response cache off, so every call goes through the
+rate limiter, streaming publisher and token tracking but never leaves the
+machine. The rate limiter gets a quota that never binds. With a synthetic latency and token rate the timings include a
+repeatable stand-in for the model; the difference to the synthetic time
+is our overhead.
+
+Run it from the project root (where `config.yaml` lives):
+
+    $ python -m benchmarks.bench_llm_replay [calls] [latency] [tokens_per_second]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from src.llm import LLM
+from src.llm.cassette import Cassette
+from src.llm.rate_limiter import RateLimiter
+
+PROJECT = "bench-llm-replay"
+RESPONSE = " ".join(["token"] * 200)
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    tokens_per_second = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+
+    with tempfile.TemporaryDirectory() as directory:
+        cassette = Cassette(os.path.join(directory, "llm.jsonl"), mode="replay",
+                            latency=latency, tokens_per_second=tokens_per_second)
+        prompts = [f"benchmark prompt {index}" for index in range(calls)]
+        for prompt in prompts:
+            cassette.put("gpt-4o", prompt, RESPONSE)
+        LLM._cassette = cassette
+        # Keep the limiter in the path but out of the timings: the configured
+        # Azure quota would otherwise set the pace instead of our code
+        LLM._rate_limiter = RateLimiter(requests_per_minute=10 ** 9, tokens_per_minute=10 ** 12, burst_size=10 ** 6)
+
+        llm = LLM(model_id="gpt-4o")
+        llm.use_cache = False
+        llm.inference(prompts[0], PROJECT)  # warm up
+
+        timings = []
+        for prompt in prompts:
+            start = time.perf_counter()
+            llm.inference(prompt, PROJECT)
+            timings.append(time.perf_counter() - start)
+
+    synthetic = latency + (len(RESPONSE.split()) / tokens_per_second if tokens_per_second else 0.0)
+    timings.sort()
+    print(f"calls:              {calls}")
+    print(f"synthetic model:    {synthetic * 1e3:10.2f} ms/call")
+    print(f"p50:                {statistics.median(timings) * 1e3:10.2f} ms/call")
+    print(f"p95:                {timings[int(len(timings) * 0.95) - 1] * 1e3:10.2f} ms/call")
+    print(f"overhead (p50):     {(statistics.median(timings) - synthetic) * 1e3:10.2f} ms/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Micro-benchmark: per-call overhead of instantiating a store and reading state.
+
+Compares the old pattern, where every ``AgentState()`` built its own engine
+and ran ``create_all``, with the shared engine registry in ``src.storage``.
+
+Run it from the project root (where `config.yaml` lives):
+
+    $ python -m benchmarks.bench_storage_engine [iterations]
+"""
+import sys
+import time
+
+from sqlmodel import Session, SQLModel, create_engine
+
+from src.state import AgentState, AgentStateHeader
+from src.storage import get_engine
+from src.storage.engine import sqlite_url
+
+PROJECT = "bench-storage-engine"
+
+
+def per_call_engine(iterations: int) -> float:
+    """Old behaviour: a fresh engine and schema check per store instance."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        engine = create_engine(sqlite_url())
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.get(AgentStateHeader, PROJECT)
+        engine.dispose()
+    return time.perf_counter() - start
+
+
+def shared_engine(iterations: int) -> float:
+    """New behaviour: stores reuse the registered engine and pool."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        # Read through a session like the old case; the store's accessors
+        # are served from the latest-state cache and would not touch the engine
+        with AgentState().session_factory() as session:
+            session.get(AgentStateHeader, PROJECT)
+    return time.perf_counter() - start
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    get_engine()
+    AgentState().create_state(PROJECT)
+
+    try:
+        before = per_call_engine(iterations)
+        after = shared_engine(iterations)
+    finally:
+        AgentState().delete_state(PROJECT)
+
+    print(f"iterations:         {iterations}")
+    print(f"per-call engine:    {before / iterations * 1e6:10.1f} us/call")
+    print(f"shared engine:      {after / iterations * 1e6:10.1f} us/call")
+    print(f"speedup:            {before / after:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,13 @@
 import asyncio
 import logging
 from flask import Flask
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, emit
 from flask_cors import CORS
 from src.agents.agent import Agent
 from src.config import Config
 from src.apis.project import project_bp, _run_agent
 from src.apis.status import status_bp
+from src.apis.usage import usage_bp
 from src.socket_instance import socketio, emit_agent
 from prometheus_client import start_http_server
 from opentelemetry import trace
@@ -15,6 +16,8 @@ from opentelemetry.sdk.trace.export import ConsoleSpanExporter, BatchSpanProcess
 import threading
 from werkzeug.utils import secure_filename
 from src.project import ProjectManager
+from src.state import AgentState
+from src.storage import init_db
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -35,12 +38,17 @@ app = Flask(__name__)
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 app.register_blueprint(project_bp)
 app.register_blueprint(status_bp)
+app.register_blueprint(usage_bp)
 
 # Initialize Flask-SocketIO
 socketio.init_app(app)
 
-# Start Prometheus metrics server
 config = Config()
+
+# Create the shared database engine and schema once for all stores
+init_db()
+
+# Start Prometheus metrics server
 start_http_server(config.monitoring.metrics.prometheus.port)
 
 # Initialize agent
@@ -54,6 +62,17 @@ agent = Agent(
 def handle_socket_connect(data):
     logger.info("Socket connected: %s", data)
 
+@socketio.on('agent-state-resync')
+def handle_agent_state_resync(data):
+    """Send a state snapshot to a client that missed `agent-state-delta` events.
+
+    Expected payload: {"project_name": str, "seq": int} where *seq* is the
+    last sequence number the client applied.
+    """
+    project_name = secure_filename(data.get("project_name", ""))
+    since = int(data.get("seq") or 0)
+    emit("agent-state-snapshot", AgentState().get_snapshot(project_name, since))
+
 @socketio.on('user-message')
 def handle_user_message(data):
     """Handle real-time user prompt via Socket.IO.
@@ -1,20 +1,32 @@
 import json
+from typing import List, Optional
 from src.agents.base_agent import BaseAgent
 from src.services.utils import retry_wrapper, validate_responses
 from src.config import Config
 
+# How ProjectManager.get_all_messages_formatted marks messages of the user
+USER_PREFIX = "User: "
+
 class Action(BaseAgent):
     def __init__(self, base_model: str):
         super().__init__(base_model)
         config = Config()
         self.project_dir = config.get_projects_dir()
 
-    def format_prompt(self, conversation: str) -> str:
-        """Format the action prompt with the conversation."""
+    def format_prompt(self, conversation: List[str]) -> str:
+        """Format the action prompt with the conversation, one message per line."""
         prompt_template = self.get_prompt("action")
         if not prompt_template:
             raise ValueError("Action prompt not found in prompts.yaml")
-        return super().format_prompt(prompt_template, conversation=conversation)
+        return super().format_prompt(prompt_template, conversation="\n".join(conversation))
+
+    @staticmethod
+    def latest_user_message(conversation: List[str]) -> Optional[str]:
+        """Return the text of the newest user message in *conversation*, if any."""
+        for message in reversed(conversation):
+            if message.startswith(USER_PREFIX):
+                return message[len(USER_PREFIX):]
+        return None
 
     @validate_responses
     def validate_response(self, response: str):
@@ -27,5 +39,7 @@ class Action(BaseAgent):
     def execute(self, conversation: list, project_name: str) -> str:
         """Execute the action agent."""
         prompt = self.format_prompt(conversation)
-        response = self.llm.inference(prompt, project_name)
+        # The user's latest request is what gets reworded between otherwise
+        # identical conversations; the last message is usually the agent's reply
+        response = self.llm.inference(prompt, project_name, semantic_key=self.latest_user_message(conversation))
         return self.validate_response(response)
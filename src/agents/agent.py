@@ -21,6 +21,7 @@ from src.browser.search import SearchEngine
 from src.browser import Browser
 from src.browser import start_interaction
 from src.filesystem import ReadCode
+from src.prompts.prompt_budget import PromptBudget
 from src.services import Netlify
 from src.documenter.pdf import PDF
 
@@ -82,7 +83,7 @@ class Agent:
         self.engine = search_engine
         self.tokenizer = tiktoken.get_encoding("cl100k_base")
         # Use the provided base_model for the root LLM instance as well.
-        self.llm = LLM(model_id=base_model)
+        self.llm = LLM(model_id=base_model, agent="agent")
         self.search_engine = SearchEngine()
         self.token_tracker = TokenTracker()
 
@@ -116,7 +117,7 @@ class Agent:
     async def search_queries(self, queries: list, project_name: str) -> dict:
         with tracer.start_as_current_span("agent_search_queries") as span:
             span.set_attribute("queries", json.dumps(queries))
-            results = {}
+            pages = {}
             knowledge_base = KnowledgeBase()
             web_search = SearchEngine()
             self.logger.info(f"\nSearch Engine :: {web_search.primary_engine}")
@@ -135,9 +136,13 @@ class Agent:
                     continue
                 browser, raw, data = loop.run_until_complete(self.open_page(project_name, link))
                 emit_agent("screenshot", {"data": raw, "project_name": project_name}, False)
-                results[query] = self.formatter.execute(data, project_name)
+                pages[query] = data
 
                 self.logger.info(f"got the search results for : {query}")
+
+            # The pages are independent, so they are formatted concurrently
+            formatted = self.formatter.execute_many(list(pages.values()), project_name=project_name)
+            results = dict(zip(pages.keys(), formatted))
             span.set_status(Status(StatusCode.OK))
             return results
 
@@ -221,10 +226,12 @@ class Agent:
 
         self.agent_state.set_agent_active(project_name, True)
 
-        conversation = self.project_manager.get_all_messages_formatted(project_name)
-        code_markdown = ReadCode(project_name).code_set_to_markdown()
+        messages = self.project_manager.get_all_messages_formatted(project_name)
+        code_files = ReadCode(project_name).read_directory()
 
-        response, action = self.action.execute(conversation, project_name)
+        # Each agent gets the conversation and code cut to its own token budget
+        action_budget = PromptBudget.for_agent("action", self.tokenizer)
+        response, action = self.action.execute(action_budget.fit_messages("conversation", messages), project_name)
 
         # Filter out generic meta-responses like "Understood, please provide the plan..."
         normalized_resp = response.strip().lower()
@@ -261,9 +268,10 @@ class Agent:
             self.project_manager.add_message_from_agent(project_name, response)
 
         elif action == "feature":
+            budget = PromptBudget.for_agent("feature", self.tokenizer)
             code = self.feature.execute(
-                conversation=conversation,
-                code_markdown=code_markdown,
+                conversation=budget.fit_messages("conversation", messages),
+                code_markdown=budget.fit_code("code_markdown", code_files),
                 system_os=os_system,
                 project_name=project_name
             )
@@ -271,9 +279,10 @@ class Agent:
             self.feature.save_code_to_project(code, project_name)
 
         elif action == "bug":
+            budget = PromptBudget.for_agent("patcher", self.tokenizer)
             code = self.patcher.execute(
-                conversation=conversation,
-                code_markdown=code_markdown,
+                conversation=budget.fit_messages("conversation", messages),
+                code_markdown=budget.fit_code("code_markdown", code_files, error=prompt),
                 commands=None,
                 error=prompt,
                 system_os=os_system,
@@ -283,7 +292,12 @@ class Agent:
             self.patcher.save_code_to_project(code, project_name)
 
         elif action == "report":
-            markdown = self.reporter.execute(conversation, code_markdown, project_name)
+            budget = PromptBudget.for_agent("reporter", self.tokenizer)
+            markdown = self.reporter.execute(
+                budget.fit_messages("conversation", messages),
+                budget.fit_code("code_markdown", code_files),
+                project_name
+            )
 
             _out_pdf_file = PDF().markdown_to_pdf(markdown, project_name)
 
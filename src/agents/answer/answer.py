@@ -50,7 +50,7 @@ class Answer(BaseAgent):
     def execute(self, question: str, context: str = "", project_name: str = "") -> str:
         """Execute the answer agent."""
         formatted_prompt = self.format_prompt(question, context)
-        response = self.llm.inference(formatted_prompt, project_name)
+        response = self.llm.inference(formatted_prompt, project_name, semantic_key=question)
         return self.validate_response(response)
 
     def parse_response(self, response: str) -> dict:
@@ -5,7 +5,7 @@ from src.logger import Logger
 
 class BaseAgent:
     def __init__(self, base_model: str):
-        self.llm = LLM(model_id=base_model)
+        self.llm = LLM(model_id=base_model, agent=type(self).__name__.lower())
         self.prompt_manager = PromptManager()
         self.logger = Logger()
 
@@ -4,7 +4,6 @@ import json
 
 from typing import List, Dict
 from src.config import Config
-from src.llm import LLM
 from src.state import AgentState
 from src.logger import Logger
 from src.services.utils import retry_wrapper, validate_responses
@@ -18,7 +17,6 @@ class Coder(BaseAgent):
         config = Config()
         self.project_dir = config.get_projects_dir()
         self.logger = Logger()
-        self.llm = LLM(model_id=base_model)
 
     def format_prompt(self, step_by_step_plan: str, user_context: str, search_results: dict) -> str:
         """Format the coder prompt with the task and context."""
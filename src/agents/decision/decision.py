@@ -33,7 +33,7 @@ class Decision(BaseAgent):
     def execute(self, task: str, context: str = "", project_name: str = "") -> str:
         """Execute the decision agent."""
         formatted_prompt = self.format_prompt(task, context)
-        response = self.llm.inference(formatted_prompt, project_name)
+        response = self.llm.inference(formatted_prompt, project_name, semantic_key=task)
         return self.validate_response(response)
 
     def parse_response(self, response: str) -> dict:
@@ -5,7 +5,6 @@ import json
 from typing import List, Dict
 
 from src.config import Config
-from src.llm import LLM
 from src.state import AgentState
 from src.services.utils import retry_wrapper, validate_responses
 from src.socket_instance import emit_agent
@@ -17,8 +16,6 @@ class Feature(BaseAgent):
         super().__init__(base_model)
         config = Config()
         self.project_dir = config.get_projects_dir()
-        
-        self.llm = LLM(model_id=base_model)
 
     def format_prompt(self, feature_request: str, context: str = "") -> str:
         """Format the feature prompt with the feature request and context."""
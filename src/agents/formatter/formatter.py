@@ -34,6 +34,20 @@ class Formatter(BaseAgent):
         response = self.llm.inference(formatted_prompt, project_name)
         return self.validate_response(response)
 
+    def execute_many(self, codes: list, language: str = "python", project_name: str = "") -> list:
+        """Format several pieces of text concurrently, in order.
+
+        Items whose call failed or whose response is invalid fall back to
+        `execute` and its retries.
+        """
+        prompts = [self.format_prompt(code, language) for code in codes]
+        responses = self.llm.inference_many(prompts, project_name)
+        results = []
+        for code, response in zip(codes, responses):
+            result = False if isinstance(response, Exception) else self.validate_response(response)
+            results.append(result or self.execute(code, language, project_name))
+        return results
+
     def parse_response(self, response: str) -> dict:
         """Parse the formatter's response into a structured format."""
         try:
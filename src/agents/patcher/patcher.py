@@ -6,7 +6,6 @@ from typing import List, Dict
 from src.socket_instance import emit_agent
 
 from src.config import Config
-from src.llm import LLM
 from src.state import AgentState
 from src.services.utils import retry_wrapper, validate_responses
 from src.agents.base_agent import BaseAgent
@@ -17,8 +16,6 @@ class Patcher(BaseAgent):
         super().__init__(base_model)
         config = Config()
         self.project_dir = config.get_projects_dir()
-        
-        self.llm = LLM(model_id=base_model)
 
     def format_prompt(self, conversation: list, code_markdown: str, commands: list, error :str, system_os: str) -> str:
         """Format the patcher prompt with the code and issue."""
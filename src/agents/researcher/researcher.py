@@ -1,7 +1,6 @@
 import json
 from typing import List
 
-from src.llm import LLM
 from src.services.utils import retry_wrapper, validate_responses
 from src.agents.base_agent import BaseAgent
 from agent.core.knowledge_base import KnowledgeBase
@@ -9,7 +8,6 @@ from agent.core.knowledge_base import KnowledgeBase
 class Researcher(BaseAgent):
     def __init__(self, base_model: str):
         super().__init__(base_model)
-        self.llm = LLM(model_id=base_model)
 
     def format_prompt(self, plan: str) -> str:
         """Format the researcher prompt with the plan."""
@@ -39,7 +37,7 @@ class Researcher(BaseAgent):
     def execute(self, plan: str, project_name: str) -> str:
         """Execute the researcher agent."""
         formatted_prompt = self.format_prompt(plan)
-        response = self.llm.inference(formatted_prompt, project_name)
+        response = self.llm.inference(formatted_prompt, project_name, semantic_key=plan)
         validated = self.validate_response(response)
         # Store in knowledge base if valid
         if validated:
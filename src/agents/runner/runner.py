@@ -4,7 +4,6 @@ import os
 from src.services.terminal_runner import TerminalRunner
 from src.agents.patcher import Patcher
 from src.agents.base_agent import BaseAgent
-from src.llm import LLM
 from src.services.utils import retry_wrapper, validate_responses
 from agent.core.knowledge_base import KnowledgeBase
 
@@ -13,7 +12,6 @@ class Runner(BaseAgent):
         super().__init__(base_model)
         self.base_model = base_model
         self.terminal_runner = TerminalRunner()
-        self.llm = LLM(model_id=base_model)
 
     def format_prompt(self, conversation: str, code_markdown: str, system_os: str, commands: list, error: str) -> str:
         """Format the runner prompt with the code and context."""
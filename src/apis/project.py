@@ -1,8 +1,9 @@
-from flask import blueprints, request, jsonify, send_file, make_response
+from flask import blueprints, request, jsonify, send_file, make_response, Response, stream_with_context
 from werkzeug.utils import secure_filename
 from src.logger import Logger, route_logger
 from src.config import Config
 from src.project import ProjectManager
+from src.apis.status import invalidate_data_cache
 from ..state import AgentState
 from src.agents.agent import Agent
 from src.socket_instance import emit_agent
@@ -25,12 +26,36 @@ def project_files():
     files = manager.get_project_files(project_name)  
     return jsonify({"files": files})
 
+@project_bp.route("/api/project-manifest", methods=["GET"])
+@route_logger(logger)
+def project_manifest():
+    """List project files (path, size, mtime, content hash) without their contents."""
+    project_name = secure_filename(request.args.get("project_name"))
+    response = jsonify(manager.get_project_manifest(project_name))
+    response.add_etag()
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+@project_bp.route("/api/project-file", methods=["GET"])
+@route_logger(logger)
+def project_file():
+    """Return one project file; its content hash is the ETag for If-None-Match."""
+    project_name = secure_filename(request.args.get("project_name"))
+    content = manager.read_project_file(project_name, request.args.get("file"))
+    if content is None:
+        return jsonify({"error": "File not found"}), 404
+    response = jsonify(content)
+    response.set_etag(content["hash"])
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
 @project_bp.route("/api/create-project", methods=["POST"])
 @route_logger(logger)
 def create_project():
     data = request.json
     project_name = data.get("project_name")
     manager.create_project(secure_filename(project_name))
+    invalidate_data_cache()
     return jsonify({"message": "Project created"})
 
 
@@ -41,6 +66,7 @@ def delete_project():
     project_name = secure_filename(data.get("project_name"))
     manager.delete_project(project_name)
     AgentState().delete_state(project_name)
+    invalidate_data_cache()
     return jsonify({"message": "Project deleted"})
 
 # ------------------------------------------------------------------
@@ -82,7 +108,7 @@ def execute_agent():
 def get_messages():
     data = request.json
     project_name = secure_filename(data.get("project_name"))
-    msgs = manager.get_messages(project_name) or []
+    msgs = manager.get_messages(project_name, since=data.get("since"), limit=data.get("limit")) or []
     return jsonify({"messages": msgs})
 
 @project_bp.route("/api/get-agent-state", methods=["POST"])
@@ -90,6 +116,9 @@ def get_messages():
 def get_agent_state():
     data = request.json
     project_name = secure_filename(data.get("project_name"))
+    since = data.get("since")
+    if since is not None:
+        return jsonify(AgentState().get_snapshot(project_name, int(since)))
     state = AgentState().get_current_state(project_name) or []
     return jsonify({"state": state})
 
@@ -97,9 +126,25 @@ def get_agent_state():
 @route_logger(logger)
 def download_project():
     project_name = secure_filename(request.args.get("project_name"))
-    manager.project_to_zip(project_name)
-    project_path = manager.get_zip_path(project_name)
-    return send_file(project_path, as_attachment=False)
+    # compression=store skips deflate entirely, e.g. for media-heavy projects
+    store_only = request.args.get("compression") == "store"
+    download_name = f"{project_name}.zip"
+
+    archive_path, digest = manager.get_cached_archive(project_name, store_only)
+    if archive_path:
+        return send_file(archive_path, as_attachment=False, download_name=download_name,
+                         etag=digest, conditional=True)
+    if digest in request.if_none_match:
+        return Response(status=304, headers={"ETag": f'"{digest}"'})
+
+    # Not cached yet: stream the archive while it is being built (and cached)
+    response = Response(
+        stream_with_context(manager.stream_project_zip(project_name, store_only, digest)),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f'inline; filename="{download_name}"'}
+    )
+    response.set_etag(digest)
+    return response
 
 
 @project_bp.route("/api/download-project-pdf", methods=["GET"])
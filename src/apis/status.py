@@ -1,4 +1,7 @@
-from flask import Blueprint, jsonify
+import threading
+import time
+
+from flask import Blueprint, jsonify, request
 
 from src.project import ProjectManager
 from src.state import AgentState
@@ -10,23 +13,24 @@ from src.config import Config
 
 status_bp = Blueprint("status_bp", __name__)
 
+# /api/data is polled by every open dashboard; its payload is rebuilt at
+# most once per TTL and clients revalidate it with If-None-Match.
+_data_cache = {"payload": None, "expires": 0.0}
+_data_cache_lock = threading.Lock()
 
-@status_bp.route("/api/status", methods=["GET"])
-def get_status():
-    """Simple liveness check so UI can verify backend is up."""
-    return jsonify({"ok": True})
 
+def invalidate_data_cache():
+    """Drop the cached /api/data payload, e.g. after a project was created or deleted."""
+    with _data_cache_lock:
+        _data_cache["payload"] = None
+        _data_cache["expires"] = 0.0
 
-@status_bp.route("/api/data", methods=["GET"])
-def get_data():
-    """Return list of projects and whether each agent is currently active."""
+
+def _build_data() -> dict:
     pm = ProjectManager()
     projects = pm.get_project_list()
 
-    state_mgr = AgentState()
-    active = {
-        name: bool(state_mgr.is_agent_active(name)) or False for name in projects
-    }
+    active = AgentState().get_active_flags(projects)
 
     # Provide extra data required by the front-end (models, search engines)
     cfg = Config()
@@ -51,9 +55,32 @@ def get_data():
     if isinstance(extra_eng, list):
         search_engines.extend(extra_eng)
 
-    return jsonify({
+    return {
         "projects": projects,
         "active": active,
         "models": models_dict,
         "search_engines": list(dict.fromkeys(search_engines)),
-    })
+    }
+
+
+@status_bp.route("/api/status", methods=["GET"])
+def get_status():
+    """Simple liveness check so UI can verify backend is up."""
+    return jsonify({"ok": True})
+
+
+@status_bp.route("/api/data", methods=["GET"])
+def get_data():
+    """Return list of projects and whether each agent is currently active."""
+    ttl = Config().get("server.data_cache_ttl", 2)
+    with _data_cache_lock:
+        payload = _data_cache["payload"]
+        if payload is None or time.monotonic() >= _data_cache["expires"]:
+            payload = _build_data()
+            _data_cache["payload"] = payload
+            _data_cache["expires"] = time.monotonic() + ttl
+
+    response = jsonify(payload)
+    response.add_etag()
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
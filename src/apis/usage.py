@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+
+from flask import Blueprint, jsonify, request
+
+from src.logger import Logger, route_logger
+from src.utils.usage_ledger import UsageLedger
+
+usage_bp = Blueprint("usage", __name__)
+
+logger = Logger()
+
+
+def _parse_since(value: str) -> float:
+    """Accept epoch seconds or an ISO 8601 timestamp (UTC unless it has an offset)."""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+@usage_bp.route("/api/usage", methods=["GET"])
+@route_logger(logger)
+def usage():
+    """Tokens and cost recorded in the usage ledger, in total and per model and project."""
+    project = request.args.get("project") or None
+    since = request.args.get("since")
+    try:
+        since = _parse_since(since) if since else None
+    except ValueError:
+        return jsonify({"error": "since must be epoch seconds or an ISO 8601 timestamp"}), 400
+    return jsonify(UsageLedger.shared().summary(project=project, since=since))
@@ -15,37 +15,15 @@ import asyncio
 from functools import lru_cache
 from src.config import Config
 from src.utils.token_tracker import TokenTracker
+from src.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from src.browser.search_cache import SearchCache
 from datetime import datetime, timedelta
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
-class AsyncCache:
-    def __init__(self, max_size=1000, ttl=3600):
-        self.cache = {}
-        self.max_size = max_size
-        self.ttl = ttl
-        self.lock = asyncio.Lock()
-
-    async def get(self, key):
-        async with self.lock:
-            entry = self.cache.get(key)
-            if entry and (time.time() - entry['time']) < self.ttl:
-                return entry['value']
-            if key in self.cache:
-                del self.cache[key]
-            return None
-
-    async def set(self, key, value):
-        async with self.lock:
-            if len(self.cache) >= self.max_size:
-                # Remove oldest
-                oldest = min(self.cache.items(), key=lambda x: x[1]['time'])[0]
-                del self.cache[oldest]
-            self.cache[key] = {'value': value, 'time': time.time()}
-
 class SearchEngine:
-    _cache = AsyncCache()
+    _cache = SearchCache.from_config()
     _rate_limit = {}
     _config = Config()
     _token_tracker = TokenTracker()
@@ -179,7 +157,9 @@ class SearchEngine:
 
     async def search(self, query: str, max_results: int = 10) -> List[Dict[str, Any]]:
         cache_key = (self.primary_engine, query, max_results)
-        cached = await self._cache.get(cache_key)
+        loop = asyncio.get_running_loop()
+        # The persistent tier is a SQLite read, keep it off the event loop
+        cached = await loop.run_in_executor(None, self._cache.get, cache_key)
         if cached:
             logger.info(f"Search cache hit for {cache_key}")
             return cached
@@ -201,10 +181,12 @@ class SearchEngine:
         while attempt < self.max_retries:
             try:
                 if self.primary_engine == "duckduckgo":
-                    results = await self._duckduckgo_search(query, max_results)
+                    with CircuitBreaker.get(self.primary_engine).guard():
+                        results = await self._duckduckgo_search(query, max_results)
                 else:
                     raise Exception(f"Unsupported search engine: {self.primary_engine}")
-                await self._cache.set(cache_key, results)
+                # Waits on the SQLite group commit
+                await loop.run_in_executor(None, self._cache.set, cache_key, results)
                 # Cost tracking (approximate)
                 self._token_tracker.track_usage(
                     self.primary_engine,
@@ -213,6 +195,9 @@ class SearchEngine:
                     {"type": "search", "engine": self.primary_engine}
                 )
                 return results
+            except CircuitOpenError:
+                # The engine is known to be down: fail fast instead of retrying
+                raise
             except Exception as e:
                 logger.error(f"Search error: {str(e)} (attempt {attempt+1})")
                 await asyncio.sleep(self.retry_delay * (self.backoff_factor ** attempt))
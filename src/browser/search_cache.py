@@ -0,0 +1,71 @@
+import hashlib
+from typing import Any, Hashable, Optional
+
+import orjson
+from prometheus_client import Counter
+from sqlmodel import Field, SQLModel
+
+from src.config import Config
+from src.storage import TwoTierCache
+
+SEARCH_CACHE_HITS = Counter('search_cache_hits_total', 'Searches answered from the search cache', ['tier'])
+SEARCH_CACHE_MISSES = Counter('search_cache_misses_total', 'Searches not found in the search cache')
+
+
+class SearchCacheEntry(SQLModel, table=True):
+    """Results of one search, keyed by the hash of engine, query and result count."""
+    __tablename__ = "search_cache"
+
+    key: str = Field(primary_key=True)
+    engine: str
+    query: str
+    results: str
+    created_at: float
+    expires_at: float = Field(index=True)
+
+
+def search_cache_key(key: Hashable) -> str:
+    return hashlib.sha256(orjson.dumps(key)).hexdigest()
+
+
+class SearchCache(TwoTierCache):
+    """Two-tier cache of search results shared by every `SearchEngine`.
+
+    Results are kept across restarts and projects in the SQLite tier, as
+    JSON, and the memory tier is bounded by entry count only.
+    """
+
+    table = SearchCacheEntry
+    value_column = "results"
+    hits_total = SEARCH_CACHE_HITS
+    misses_total = SEARCH_CACHE_MISSES
+
+    def __init__(self, max_items: int = 1000, ttl: float = 86400, persistent: bool = True,
+                 max_rows: int = 20000, **kwargs):
+        super().__init__(max_items=max_items, ttl=ttl, persistent=persistent, max_rows=max_rows, **kwargs)
+
+    @classmethod
+    def from_config(cls) -> "SearchCache":
+        config = Config()
+        return cls(
+            max_items=int(config.get("search_engines.cache.max_size", 1000)),
+            ttl=float(config.get("search_engines.cache.ttl", 86400)),
+            persistent=bool(config.get("search_engines.cache.persistent", True)),
+            max_rows=int(config.get("search_engines.cache.max_rows", 20000)),
+        )
+
+    @staticmethod
+    def dumps(value: Any) -> str:
+        return orjson.dumps(value).decode("utf-8")
+
+    @staticmethod
+    def loads(data: str) -> Any:
+        return orjson.loads(data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached results of *key* (e.g. ``(engine, query, max_results)``), or None."""
+        return self.lookup(search_cache_key(key))
+
+    def set(self, key: Hashable, value: Any):
+        engine, query = (key[0], key[1]) if isinstance(key, tuple) and len(key) > 1 else ("", str(key))
+        self.store(search_cache_key(key), value, engine=str(engine), query=str(query))
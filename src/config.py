@@ -317,6 +317,10 @@ class Config:
 
             # Tavily
             "TAVILY_API_KEY": ("API_KEYS", "TAVILY"),
+
+            # Offline LLM record/replay
+            "LLM_REPLAY_MODE": ("llm_replay", "mode"),
+            "LLM_CASSETTE": ("llm_replay", "cassette"),
         }
 
         for env, path in env_map.items():
@@ -19,7 +19,11 @@ class ReadCode:
                 try:
                     file_path = os.path.join(root, file)
                     with open(file_path, 'r') as file_content:
-                        files_list.append({"filename": file_path, "code": file_content.read()})
+                        files_list.append({
+                            "filename": file_path,
+                            "code": file_content.read(),
+                            "mtime": os.path.getmtime(file_path)
+                        })
                 except:
                     pass
 
@@ -24,6 +24,11 @@ def init_agent():
     os.makedirs(projects_dir, exist_ok=True)
     os.makedirs(logs_dir, exist_ok=True)
 
+    from src.storage import init_db
+
+    logger.info("Initializing database...")
+    init_db()
+
     from src.bert.sentence import SentenceBert
 
     logger.info("Loading sentence-transformer BERT models...")
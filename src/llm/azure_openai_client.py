@@ -1,35 +1,99 @@
-import openai
 import asyncio
+import threading
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import httpx
+import openai
 from src.config import Config
 from src.logger import Logger
 
 log = Logger()
 
+
 class AzureOpenAI:
+    """Azure OpenAI chat completions over a pooled async client.
+
+    Clients are shared per (endpoint, api_version), so TLS sessions and
+    keep-alive connections are reused across calls instead of being rebuilt
+    on every attempt. Requests in flight per deployment are capped by
+    ``azure_openai.max_in_flight``.
+
+    The pooled clients and semaphores are bound to the event loop they are
+    first used on; `LLM` only calls them from the shared background loop.
+    """
+    _clients: Dict[Tuple[str, str], openai.AsyncAzureOpenAI] = {}
+    _in_flight: Dict[Tuple[str, str], asyncio.Semaphore] = {}
+    _lock = threading.Lock()
+
     def __init__(self):
         config = Config()
         self.api_key = config.get_openai_api_key()
         self.api_base = config.get_openai_api_base_url()
-        self.api_version = "2024-02-15-preview"  # Latest stable version
+        self.api_version = config.get("azure_openai.api_version", "2024-02-15-preview")
         self.deployment_name = "gpt-4"  # Default deployment name
-        
-        try:
-            self.client = openai.AzureOpenAI(
-                api_key=self.api_key,
-                api_version=self.api_version,
-                azure_endpoint=self.api_base
+        self.timeout = config.get("azure_openai.timeout", 60)
+        self.max_connections = config.get("azure_openai.max_connections", 20)
+        self.keepalive_expiry = config.get("azure_openai.keepalive_expiry", 30)
+        self.max_in_flight = config.get("azure_openai.max_in_flight", 8)
+        # Streamed usage needs api_version 2024-09-01-preview or later
+        self.stream_usage = config.get("azure_openai.stream_usage", False)
+        self.client = self._pooled_client()
+
+    def _pooled_client(self) -> openai.AsyncAzureOpenAI:
+        key = (self.api_base, self.api_version)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                try:
+                    client = openai.AsyncAzureOpenAI(
+                        api_key=self.api_key,
+                        api_version=self.api_version,
+                        azure_endpoint=self.api_base,
+                        timeout=self.timeout,
+                        http_client=httpx.AsyncClient(
+                            limits=httpx.Limits(
+                                max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections,
+                                keepalive_expiry=self.keepalive_expiry
+                            ),
+                            timeout=self.timeout
+                        )
+                    )
+                    log.info(f"Azure OpenAI client initialized for {self.api_base} ({self.api_version})")
+                except Exception as e:
+                    log.error(f"Failed to initialize Azure OpenAI client: {str(e)}")
+                    raise
+                self._clients[key] = client
+            return client
+
+    def _semaphore(self, model_id: str) -> asyncio.Semaphore:
+        key = (self.api_base, model_id)
+        with self._lock:
+            semaphore = self._in_flight.get(key)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self.max_in_flight)
+                self._in_flight[key] = semaphore
+            return semaphore
+
+    @staticmethod
+    def _report_usage(reported, usage: Optional[dict]):
+        if reported is not None and usage is not None:
+            usage.update(
+                prompt_tokens=reported.prompt_tokens,
+                completion_tokens=reported.completion_tokens,
+                total_tokens=reported.total_tokens,
             )
-            log.info("Azure OpenAI client initialized successfully")
-        except Exception as e:
-            log.error(f"Failed to initialize Azure OpenAI client: {str(e)}")
-            raise
 
-    async def inference(self, model_id: str, prompt: str) -> str:
+    async def inference(self, model_id: str, prompt: str, temperature: float = 0,
+                        usage: Optional[dict] = None) -> str:
+        """Return the completion of *prompt*, filling *usage* with the token counts the API reported."""
         try:
-            loop = asyncio.get_event_loop()
-            chat_completion = await loop.run_in_executor(
-                None,
-                lambda: self.client.chat.completions.create(
+            async with self._semaphore(model_id):
+                chat_completion = await self.client.chat.completions.create(
                     model=model_id,
                     messages=[
                         {
@@ -37,10 +101,56 @@ class AzureOpenAI:
                             "content": prompt.strip(),
                         }
                     ],
-                    temperature=0
+                    temperature=temperature
                 )
-            )
+            self._report_usage(chat_completion.usage, usage)
             return chat_completion.choices[0].message.content
         except Exception as e:
             log.error(f"Error during Azure OpenAI inference: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
+
+    async def astream(self, model_id: str, prompt: str, temperature: float = 0,
+                      usage: Optional[dict] = None) -> AsyncIterator[str]:
+        """Yield the completion of *prompt* piece by piece as the model produces it.
+
+        With ``azure_openai.stream_usage`` the API sends the token counts in
+        a last chunk, and *usage* is filled with them once the stream ends.
+        """
+        options = {"stream_options": {"include_usage": True}} if self.stream_usage else {}
+        try:
+            async with self._semaphore(model_id):
+                stream = await self.client.chat.completions.create(
+                    model=model_id,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": prompt.strip(),
+                        }
+                    ],
+                    temperature=temperature,
+                    stream=True,
+                    **options
+                )
+                try:
+                    async for chunk in stream:
+                        # Azure sends chunks without choices (e.g. content filter results)
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            yield chunk.choices[0].delta.content
+                        self._report_usage(getattr(chunk, "usage", None), usage)
+                finally:
+                    # Also reached when the caller gives up on the stream
+                    # (deadline, lost hedge): drop the connection right away
+                    await stream.close()
+        except Exception as e:
+            log.error(f"Error during Azure OpenAI streaming inference: {str(e)}")
+            raise
+
+    @classmethod
+    async def aclose(cls):
+        """Close every pooled client and its connections."""
+        with cls._lock:
+            clients = list(cls._clients.values())
+            cls._clients.clear()
+            cls._in_flight.clear()
+        for client in clients:
+            await client.close()
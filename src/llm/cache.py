@@ -0,0 +1,83 @@
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from prometheus_client import Counter
+from sqlmodel import Field, SQLModel
+
+from src.config import Config
+from src.storage import TwoTierCache
+
+LLM_CACHE_HITS = Counter('llm_cache_hits_total', 'LLM responses served from the response cache', ['tier'])
+LLM_CACHE_MISSES = Counter('llm_cache_misses_total', 'LLM calls not found in the response cache')
+
+
+class LLMCacheEntry(SQLModel, table=True):
+    """A cached LLM response, keyed by the hash of model, prompt and parameters."""
+    __tablename__ = "llm_cache"
+
+    key: str = Field(primary_key=True)
+    model: str
+    response: str
+    created_at: float
+    expires_at: float = Field(index=True)
+
+
+def cache_key(model_id: str, prompt: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Return the SHA-256 key of a call, so prompts are not kept alive as dict keys."""
+    payload = json.dumps([model_id, prompt, params or {}], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache(TwoTierCache):
+    """Two-tier cache of LLM responses shared by every `LLM` instance.
+
+    Unlike the other `TwoTierCache` users its memory tier is bounded by the
+    bytes of the cached responses by default, not only by entry count.
+    """
+
+    table = LLMCacheEntry
+    value_column = "response"
+    hits_total = LLM_CACHE_HITS
+    misses_total = LLM_CACHE_MISSES
+
+    def __init__(self, max_items: int = 1000, max_bytes: int = 64 * 1024 * 1024, ttl: float = 3600,
+                 persistent: bool = True, max_rows: int = 10000, url: Optional[str] = None, **kwargs):
+        super().__init__(max_items=max_items, max_bytes=max_bytes, ttl=ttl, persistent=persistent,
+                         max_rows=max_rows, url=url, **kwargs)
+
+    @classmethod
+    def from_config(cls) -> "ResponseCache":
+        config = Config()
+        return cls(
+            max_items=int(config.get("storage.cache.max_size", 1000)),
+            max_bytes=int(config.get("storage.cache.max_bytes", 64 * 1024 * 1024)),
+            ttl=float(config.get("storage.cache.ttl", 3600)),
+            persistent=bool(config.get("storage.cache.persistent", True)),
+            max_rows=int(config.get("storage.cache.max_rows", 10000)),
+        )
+
+    key = staticmethod(cache_key)
+
+    @staticmethod
+    def enabled_for(agent: Optional[str], temperature: float = 0) -> bool:
+        """Whether calls made for *agent* should use the cache.
+
+        ``storage.cache.agents.<agent>`` overrides the global ``enabled``
+        switch. Agents without an override only cache deterministic calls,
+        i.e. at temperature 0.
+        """
+        config = Config()
+        if not config.get("storage.cache.enabled", True):
+            return False
+        override = config.get(f"storage.cache.agents.{agent}") if agent else None
+        if override is not None:
+            return bool(override)
+        return not temperature
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response of *key*, or None."""
+        return self.lookup(key)
+
+    def put(self, key: str, model: str, response: str):
+        self.store(key, response, model=model)
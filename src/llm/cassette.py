@@ -0,0 +1,150 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from src.config import Config
+from .cache import cache_key
+
+logger = logging.getLogger(__name__)
+
+OFF = "off"
+RECORD = "record"
+REPLAY = "replay"
+
+# Replayed responses are split on whitespace; close enough to model tokens
+# for pacing, and independent of the tokenizer installed
+_TOKEN_RE = re.compile(r"\s*\S+\s*")
+
+
+class CassetteMissError(LookupError):
+    """Raised when a replayed prompt was never recorded."""
+
+    def __init__(self, key: str, path: str):
+        super().__init__(f"No recorded response for prompt {key[:12]} in {path}; record it with llm_replay.mode=record")
+        self.key = key
+
+
+class Cassette:
+    """Recorded LLM responses, keyed by the hash of model, prompt and temperature.
+
+    In ``record`` mode live Azure responses are passed through and appended
+    to the cassette, a JSON Lines file with one interaction per line (a
+    prompt recorded again is replaced by its later line). In ``replay``
+    mode they are served from it without any network access, after
+    *latency* seconds and at *tokens_per_second* (0 sends the whole
+    response at once), so the agent pipeline can run offline with
+    repeatable timings.
+    """
+
+    def __init__(self, path: str, mode: str = OFF, latency: float = 0.0,
+                 tokens_per_second: float = 0.0, chunk_tokens: int = 8,
+                 sleep: Callable[[float], Awaitable[None]] = asyncio.sleep):
+        if mode not in (OFF, RECORD, REPLAY):
+            raise ValueError(f"Unknown llm_replay.mode {mode!r}, expected off, record or replay")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.sleep = sleep
+        self._interactions: Optional[Dict[str, dict]] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "Cassette":
+        config = Config()
+        return cls(
+            path=config.get("llm_replay.cassette", "data/cassettes/llm.jsonl"),
+            mode=str(config.get("llm_replay.mode", OFF)).lower(),
+            latency=float(config.get("llm_replay.latency", 0.0)),
+            tokens_per_second=float(config.get("llm_replay.tokens_per_second", 0)),
+            chunk_tokens=int(config.get("llm_replay.chunk_tokens", 8)),
+        )
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == RECORD
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    @staticmethod
+    def key(model_id: str, prompt: str, temperature: float = 0) -> str:
+        return cache_key(model_id, prompt.strip(), {"temperature": temperature})
+
+    def get(self, model_id: str, prompt: str, temperature: float = 0) -> Optional[str]:
+        with self._lock:
+            interaction = self._load().get(self.key(model_id, prompt, temperature))
+        return interaction["response"] if interaction else None
+
+    def put(self, model_id: str, prompt: str, response: str, temperature: float = 0):
+        interaction = {
+            "key": self.key(model_id, prompt, temperature),
+            "model": model_id,
+            "temperature": temperature,
+            # Only to tell recordings apart when reading the file
+            "prompt_preview": prompt.strip()[:200],
+            "response": response,
+            "recorded_at": time.time(),
+        }
+        with self._lock:
+            self._load()[interaction["key"]] = interaction
+            self._append(interaction)
+
+    async def replay(self, model_id: str, prompt: str, temperature: float = 0) -> AsyncIterator[str]:
+        """Yield the recorded response of *prompt*, paced like a live stream."""
+        response = self.get(model_id, prompt, temperature)
+        if response is None:
+            raise CassetteMissError(self.key(model_id, prompt, temperature), self.path)
+
+        if self.latency:
+            await self.sleep(self.latency)
+        if not self.tokens_per_second:
+            yield response
+            return
+        tokens = _TOKEN_RE.findall(response) or [response]
+        for start in range(0, len(tokens), self.chunk_tokens):
+            chunk = tokens[start:start + self.chunk_tokens]
+            await self.sleep(len(chunk) / self.tokens_per_second)
+            yield "".join(chunk)
+
+    async def record(self, model_id: str, prompt: str, stream: AsyncIterator[str],
+                     temperature: float = 0) -> AsyncIterator[str]:
+        """Pass *stream* through and save its full text once it completes."""
+        chunks = []
+        async for chunk in stream:
+            chunks.append(chunk)
+            yield chunk
+        # File I/O stays off the loop the other calls are streaming on
+        await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(self.put, model_id, prompt, "".join(chunks), temperature)
+        )
+
+    def _load(self) -> Dict[str, dict]:
+        if self._interactions is None:
+            interactions = {}
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            interaction = json.loads(line)
+                            interactions[interaction["key"]] = interaction
+                logger.info(f"Loaded {len(interactions)} recorded LLM responses from {self.path}")
+            elif self.replaying:
+                logger.warning(f"LLM cassette {self.path} not found, every replayed call will miss")
+            self._interactions = interactions
+        return self._interactions
+
+    def _append(self, interaction: dict):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(interaction, sort_keys=True, ensure_ascii=False) + "\n")
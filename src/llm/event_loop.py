@@ -0,0 +1,106 @@
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Awaitable, Optional
+
+
+class BackgroundLoop:
+    """A long-lived event loop on a daemon thread, for synchronous callers.
+
+    The agents call `LLM.inference` from plain threads. Running every call
+    through `asyncio.run` creates and tears down a loop and its default
+    executor each time; submitting to this loop instead keeps them (and
+    anything bound to the loop, like HTTP clients and asyncio locks) alive
+    for the whole process.
+    """
+
+    def __init__(self, name: str = "llm-event-loop"):
+        self.name = name
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        """Start the loop thread if it is not running yet and return the loop."""
+        with self._lock:
+            if self.loop is None or self.loop.is_closed():
+                started = threading.Event()
+                self.loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._run, args=(started,), name=self.name, daemon=True)
+                self._thread.start()
+                started.wait()
+            return self.loop
+
+    def run(self, coroutine: Awaitable, timeout: Optional[float] = None) -> Any:
+        """Run *coroutine* on the background loop and block until it returns."""
+        loop = self.start()
+        if threading.current_thread() is self._thread:
+            coroutine.close()
+            raise RuntimeError("BackgroundLoop.run() called from the loop thread; await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result(timeout)
+
+    def stop(self):
+        """Stop the loop and wait for its thread to exit."""
+        with self._lock:
+            if self.loop is None or self.loop.is_closed():
+                return
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            self.loop.close()
+
+    def _run(self, started: threading.Event):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(started.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.run_until_complete(self.loop.shutdown_default_executor())
+
+
+_background_loop = BackgroundLoop()
+
+
+def run_sync(coroutine: Awaitable, timeout: Optional[float] = None) -> Any:
+    """Run *coroutine* on the process-wide background loop from synchronous code."""
+    return _background_loop.run(coroutine, timeout)
+
+
+async def run_in_background(coroutine: Awaitable) -> Any:
+    """Await *coroutine* on the background loop from any other running loop."""
+    loop = _background_loop.start()
+    if asyncio.get_running_loop() is loop:
+        return await coroutine
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, loop))
+
+
+async def iterate_in_background(iterator: AsyncIterator) -> AsyncIterator:
+    """Consume the async *iterator* on the background loop from any other running loop."""
+    loop = _background_loop.start()
+    if asyncio.get_running_loop() is loop:
+        async for item in iterator:
+            yield item
+        return
+
+    done = object()
+
+    async def next_item():
+        try:
+            return await iterator.__anext__()
+        except StopAsyncIteration:
+            return done
+
+    async def close():
+        await iterator.aclose()
+
+    try:
+        while True:
+            item = await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(next_item(), loop))
+            if item is done:
+                return
+            yield item
+    finally:
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(close(), loop))
+
+
+def background_loop() -> BackgroundLoop:
+    return _background_loop
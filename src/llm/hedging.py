@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, Dict, Optional, Tuple
+
+from prometheus_client import Counter, Histogram
+
+from src.config import Config
+
+logger = logging.getLogger(__name__)
+
+LLM_FIRST_TOKEN_LATENCY = Histogram(
+    'llm_call_first_token_seconds', 'Time to the first token of an LLM call as seen by its caller', ['agent', 'hedged'],
+    buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 21, 34, 60, 120)
+)
+LLM_HEDGE_CALLS = Counter('llm_hedge_calls_total', 'LLM calls with a known p95, by whether a hedge was sent', ['agent', 'hedged'])
+LLM_HEDGE_WINS = Counter('llm_hedge_wins_total', 'Hedged LLM calls by the request that answered first', ['agent', 'winner'])
+
+
+async def _first_chunk(stream: AsyncIterator[str]) -> Optional[str]:
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def _discard(task: asyncio.Future, stream: AsyncIterator[str]):
+    """Cancel a request that lost a race (or was abandoned) and release its connection."""
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await stream.aclose()
+
+
+async def with_deadline(stream: AsyncIterator[str], seconds: Optional[float],
+                        first_token_only: bool = False) -> AsyncIterator[str]:
+    """Yield from *stream*, cancelling it with `TimeoutError` once *seconds* have passed.
+
+    With *first_token_only* the deadline is lifted once the first chunk is
+    in, so a long response that started in time is not cut off.
+    """
+    if not seconds:
+        async for chunk in stream:
+            yield chunk
+        return
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + seconds
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(stream.__anext__(), max(0.0, deadline - loop.time()))
+            except StopAsyncIteration:
+                return
+            except TimeoutError:
+                raise TimeoutError(f"LLM call exceeded its {seconds:g}s deadline") from None
+            yield chunk
+            if first_token_only:
+                async for chunk in stream:
+                    yield chunk
+                return
+    finally:
+        await stream.aclose()
+
+
+class HedgePolicy:
+    """Sends a second request when the first is slower than usual to start answering.
+
+    First-token latencies are kept per agent and prompt size (in power of
+    two buckets of 1K tokens). Once a bucket has *min_samples* of them, a
+    call that has not produced its first token after the *quantile* of the
+    bucket opens a second, identical stream; whichever streams first is
+    used and the other is cancelled. Racing on the first token rather than
+    the full response keeps a stream that is already forwarded to the UI
+    from being replaced half way.
+
+    When the hedge wins, the primary is cancelled at once so it does not
+    hold a connection. Its latency is then only known to exceed the time
+    the hedge answered in, which is sampled instead so slow primaries
+    still count towards the quantile.
+    """
+
+    def __init__(self, enabled: bool = True, quantile: float = 0.95, window: int = 200,
+                 min_samples: int = 20, clock: Callable[[], float] = time.monotonic):
+        self.enabled = enabled
+        self.quantile = quantile
+        self.window = window
+        self.min_samples = min_samples
+        self.clock = clock
+        self._samples: Dict[Tuple[str, int], Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "HedgePolicy":
+        config = Config()
+        return cls(
+            enabled=bool(config.get("azure_openai.hedging.enabled", True)),
+            quantile=float(config.get("azure_openai.hedging.quantile", 0.95)),
+            window=int(config.get("azure_openai.hedging.window", 200)),
+            min_samples=int(config.get("azure_openai.hedging.min_samples", 20)),
+        )
+
+    @staticmethod
+    def bucket(prompt_tokens: int) -> int:
+        return (max(0, prompt_tokens) // 1024).bit_length()
+
+    def observe(self, agent: str, prompt_tokens: int, seconds: float):
+        key = (agent, self.bucket(prompt_tokens))
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def delay(self, agent: str, prompt_tokens: int) -> Optional[float]:
+        """Seconds to wait for the first token before hedging, or None if there are too few samples."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            samples = sorted(self._samples.get((agent, self.bucket(prompt_tokens)), ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(self.quantile * len(samples)))]
+
+    async def stream(self, agent: Optional[str], prompt_tokens: int, open_stream: Callable[[], AsyncIterator[str]],
+                     admit: Optional[Callable[[], bool]] = None) -> AsyncIterator[str]:
+        """Yield the response of ``open_stream()``, hedged with a second one if it is slow to start.
+
+        *admit* is asked before the hedge is sent and can veto it, e.g. when
+        the rate limit has no room for another request.
+        """
+        agent = agent or ""
+        hedge_after = self.delay(agent, prompt_tokens)
+        started = self.clock()
+        primary = open_stream()
+        primary_task = asyncio.ensure_future(_first_chunk(primary))
+        racing = {primary_task: primary}
+        hedged = False
+        winner = None
+        try:
+            if hedge_after is not None:
+                await asyncio.wait([primary_task], timeout=hedge_after)
+                if not primary_task.done() and (admit is None or admit()):
+                    hedged = True
+                    logger.info(f"Hedging LLM call for {agent}: no first token after {hedge_after:.2f}s")
+                    hedge = open_stream()
+                    racing[asyncio.ensure_future(_first_chunk(hedge))] = hedge
+
+            error = None
+            while winner is None and racing:
+                done, _ = await asyncio.wait(racing, return_when=asyncio.FIRST_COMPLETED)
+                # On a tie the primary wins, so its latency is what gets sampled
+                for task in sorted(done, key=lambda task: task is not primary_task):
+                    if task.exception() is not None:
+                        error = task.exception()
+                        await racing.pop(task).aclose()
+                    elif winner is None:
+                        winner = task
+            if winner is None:
+                raise error
+
+            answered_after = self.clock() - started
+            stream = racing.pop(winner)
+            self._record(agent, prompt_tokens, hedge_after, hedged, winner is primary_task, answered_after)
+            if winner is primary_task or primary_task in racing:
+                self.observe(agent, prompt_tokens, answered_after)
+            while racing:
+                await _discard(*racing.popitem())
+
+            try:
+                first = winner.result()
+                if first is not None:
+                    yield first
+                    async for chunk in stream:
+                        yield chunk
+            finally:
+                await stream.aclose()
+        finally:
+            while racing:
+                await _discard(*racing.popitem())
+
+    def _record(self, agent: str, prompt_tokens: int, hedge_after: Optional[float], hedged: bool,
+                primary_won: bool, answered_after: float):
+        LLM_FIRST_TOKEN_LATENCY.labels(agent=agent, hedged=str(hedged).lower()).observe(answered_after)
+        if hedge_after is not None:
+            LLM_HEDGE_CALLS.labels(agent=agent, hedged=str(hedged).lower()).inc()
+        if hedged:
+            LLM_HEDGE_WINS.labels(agent=agent, winner="primary" if primary_won else "hedge").inc()
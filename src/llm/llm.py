@@ -1,41 +1,76 @@
 import asyncio
-from typing import Tuple
+import contextlib
+import functools
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
+
+from prometheus_client import Counter
 
 from src.socket_instance import emit_agent
 from .azure_openai_client import AzureOpenAI
+from .cache import ResponseCache
+from .cassette import Cassette, CassetteMissError
+from .event_loop import iterate_in_background, run_in_background, run_sync
+from .hedging import HedgePolicy, with_deadline
+from .rate_limiter import RateLimiter
+from .semantic_cache import SemanticCache
+from .streaming import StreamPublisher
 from src.state import AgentState
 from src.config import Config
 from src.utils.token_tracker import TokenTracker
+from src.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
 import logging
-from datetime import datetime, timezone
 import tiktoken
 
 TIKTOKEN_ENC = tiktoken.get_encoding("cl100k_base")
 
 logger = logging.getLogger(__name__)
+
+COALESCED_CALLS = Counter('llm_coalesced_calls_total', 'LLM calls that awaited an identical call already in flight', ['model'])
+DEADLINE_EXCEEDED = Counter('llm_deadline_exceeded_total', 'LLM attempts cancelled at their deadline', ['agent'])
 agentState = AgentState()
 config = Config()
 
 class LLM:
-    _cache = {}
-    _rate_limit = {}
-    _lock = asyncio.Lock()
+    _cache = ResponseCache.from_config()
+    _semantic_cache = SemanticCache.from_config()
+    _cassette = Cassette.from_config()
+    _hedging = HedgePolicy.from_config()
+    _rate_limiter = RateLimiter.from_config()
+    # Identical calls in flight, by cache key. Only touched from the
+    # background loop, so it needs no lock.
+    _in_flight: Dict[str, asyncio.Task] = {}
     _config = Config()
     _token_tracker = TokenTracker()
 
-    def __init__(self, model_id: str = None):
+    def __init__(self, model_id: str = None, agent: str = None):
         self.model_id = model_id
+        self.agent = agent
+        # Generation parameters are part of the cache key
+        self.generation_params = {"temperature": self._config.get("azure_openai.temperature", 0)}
+        self.use_cache = self._cache.enabled_for(agent, self.generation_params["temperature"])
+        self.use_semantic_cache = self.use_cache and self._semantic_cache.enabled_for(agent)
         self.log_prompts = config.get_logging_prompts()
         self.timeout_inference = config.get_timeout_inference()
-        self.rate_limit_config = self._config.get("server.rate_limit", {})
-        self.requests_per_minute = self.rate_limit_config.get("requests_per_minute", 60)
-        self.burst_size = self.rate_limit_config.get("burst_size", 10)
+        # Seconds an attempt may take before it is cancelled (and retried).
+        # Agents without a deadline of their own only get TIMEOUT.INFERENCE
+        # to their first token, however long the response then takes.
+        deadline = self._config.get(f"azure_openai.deadlines.{agent}") if agent else None
+        self.deadline = deadline or self.timeout_inference
+        self.deadline_first_token_only = not deadline
+        self.completion_tokens_estimate = self._config.get("server.rate_limit.completion_tokens_estimate", 1000)
+        self.stream_emit_interval = self._config.get("azure_openai.stream_emit_interval", 0.1)
+        self.coalesce = self._config.get("storage.cache.coalesce", True)
+        self.batch_concurrency = self._config.get("azure_openai.batch_concurrency", 4)
         self.models = {
             "AZURE_OPENAI": [
                 ("GPT-4o", "gpt-4o"),
             ]
         }
 
+    @classmethod
+    def cache_stats(cls) -> dict:
+        return {**cls._cache.stats(), "semantic": cls._semantic_cache.stats()}
+
     def list_models(self) -> dict:
         return self.models
 
@@ -43,50 +78,141 @@ class LLM:
         """Return (provider_enum, internal_model_id) for *model_name*.
 
         Accepts either the display name (e.g. "GPT-4o") or the internal ID
-        (e.g. "gpt-4o"), case-insensitive.
+        (e.g. "gpt-4o"), case-insensitive. With ``llm_replay.mode: replay``
+        every model is served by the "REPLAY" provider from the cassette.
         """
         if not model_name:
             return (None, None)
 
         query = model_name.strip().lower()
+        # Fallback: assume Azure OpenAI with the provided model_name
+        provider_enum, internal_id = "AZURE_OPENAI", model_name
 
-        for provider_enum, models in self.models.items():
-            for display_name, internal_id in models:
-                if query in {display_name.lower(), internal_id.lower()}:
-                    return provider_enum, internal_id
+        for provider, models in self.models.items():
+            match = next((model_id for display_name, model_id in models
+                          if query in {display_name.lower(), model_id.lower()}), None)
+            if match:
+                provider_enum, internal_id = provider, match
+                break
 
-        # Fallback: assume Azure OpenAI with the provided model_name
-        return ("AZURE_OPENAI", model_name)
+        if self._cassette.replaying:
+            return ("REPLAY", internal_id)
+        return (provider_enum, internal_id)
 
     @staticmethod
-    def update_global_token_usage(string: str, project_name: str):
-        token_usage = len(TIKTOKEN_ENC.encode(string))
-        agentState.update_token_usage(project_name, token_usage)
-
-        total = agentState.get_latest_token_usage(project_name) + token_usage
-        emit_agent("tokens", {"token_usage": total})
+    def update_global_token_usage(string: str, project_name: str, token_usage: int = None):
+        """Add the tokens of *string* (or *token_usage*, if already counted) to the project total."""
+        if token_usage is None:
+            token_usage = len(TIKTOKEN_ENC.encode(string))
+        total = agentState.update_token_usage(project_name, token_usage)
+        emit_agent("tokens", {"token_usage": total, "project_name": project_name})
 
     # ------------------------------------------------------------------
     # Public synchronous entrypoint – safe for normal (blocking) calls.
     # Internally delegates to the async implementation.
     # ------------------------------------------------------------------
-    async def ainference(self, prompt: str, project_name: str) -> str:
-        cache_key = (self.model_id, prompt)
-        if cache_key in self._cache:
-            logger.info(f"LLM cache hit for {cache_key}")
-            return self._cache[cache_key]
-
-        # Rate limiting
-        now = datetime.now(timezone.utc)
-        window = now.replace(second=0, microsecond=0)
-        if self.model_id not in self._rate_limit:
-            self._rate_limit[self.model_id] = {}
-        if window not in self._rate_limit[self.model_id]:
-            self._rate_limit[self.model_id][window] = 0
-        if self._rate_limit[self.model_id][window] >= self.requests_per_minute:
-            logger.warning(f"LLM rate limit exceeded for {self.model_id}")
-            await asyncio.sleep(60)
-        self._rate_limit[self.model_id][window] += 1
+    async def astream(self, prompt: str, project_name: str) -> AsyncIterator[str]:
+        """Yield the response to *prompt* as it is generated.
+
+        The partial text is also pushed to the UI on the ``llm-stream``
+        channel of *project_name*. Cached responses are yielded in one piece.
+        """
+        # The pooled HTTP clients, semaphores and limiter waits all live on
+        # the shared background loop, whichever loop the caller runs on
+        async for chunk in iterate_in_background(self._astream(prompt, project_name)):
+            yield chunk
+
+    async def ainference(self, prompt: str, project_name: str, semantic_key: Optional[str] = None) -> str:
+        return await run_in_background(self._ainference(prompt, project_name, semantic_key))
+
+    async def _ainference(self, prompt: str, project_name: str, semantic_key: Optional[str] = None) -> str:
+        if not self.coalesce:
+            return await self._collect(prompt, project_name, semantic_key)
+
+        # Identical concurrent calls share one upstream request instead of
+        # each missing the cache, which is only filled once a call completes.
+        # Only calls of the same project are joined: the usage is charged
+        # and the stream published to the project of the call that runs.
+        key = self._cache.key(self.model_id, prompt, {**self.generation_params, "project": project_name})
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._collect(prompt, project_name, semantic_key))
+            self._in_flight[key] = task
+            task.add_done_callback(functools.partial(self._forget_in_flight, key))
+        else:
+            COALESCED_CALLS.labels(model=self.model_id).inc()
+            logger.info(f"LLM call for {self.model_id} ({key[:12]}) joined an identical call in flight")
+        # A cancelled caller must not cancel the request the others wait on
+        return await asyncio.shield(task)
+
+    async def ainference_many(self, prompts: List[str], project_name: str,
+                              max_concurrency: Optional[int] = None) -> List[Union[str, Exception]]:
+        """Run independent *prompts* concurrently and return their results in order.
+
+        At most *max_concurrency* calls (default ``azure_openai.batch_concurrency``)
+        are in flight at once, and each still goes through the rate limiter.
+        A prompt that fails yields its exception in place of a response
+        without affecting the others.
+        """
+        return await run_in_background(self._ainference_many(prompts, project_name, max_concurrency))
+
+    def inference_many(self, prompts: List[str], project_name: str,
+                       max_concurrency: Optional[int] = None) -> List[Union[str, Exception]]:
+        """Blocking version of `ainference_many` for synchronous callers."""
+        return run_sync(self._ainference_many(prompts, project_name, max_concurrency))
+
+    async def _ainference_many(self, prompts: List[str], project_name: str,
+                               max_concurrency: Optional[int] = None) -> List[Union[str, Exception]]:
+        semaphore = asyncio.Semaphore(max(1, max_concurrency or self.batch_concurrency))
+
+        async def run(prompt: str) -> str:
+            async with semaphore:
+                return await self._ainference(prompt, project_name)
+
+        return await asyncio.gather(*(run(prompt) for prompt in prompts), return_exceptions=True)
+
+    @classmethod
+    def _forget_in_flight(cls, key: str, task: asyncio.Task):
+        if cls._in_flight.get(key) is task:
+            del cls._in_flight[key]
+
+    async def _collect(self, prompt: str, project_name: str, semantic_key: Optional[str] = None) -> str:
+        return "".join([chunk async for chunk in self._astream(prompt, project_name, semantic_key)])
+
+    async def _semantic_lookup(self, prompt: str, semantic_key: Optional[str]) -> Tuple[Optional[tuple], Optional[str]]:
+        """Return the (namespace, embedding) to cache the response under, and a cached response if one is close enough."""
+        if not (self.use_semantic_cache and semantic_key):
+            return None, None
+        namespace = self._semantic_cache.namespace(self.model_id, self.agent, prompt, semantic_key, self.generation_params)
+        if namespace is None:
+            return None, None
+        # Embedding is CPU bound, keep it off the loop the other calls share
+        vector = await asyncio.get_running_loop().run_in_executor(None, self._semantic_cache.embed, semantic_key)
+        if vector is None:
+            return None, None
+        return (namespace, vector), self._semantic_cache.get(namespace, vector, self.agent)
+
+    async def _astream(self, prompt: str, project_name: str, semantic_key: Optional[str] = None) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        cache_key = self._cache.key(self.model_id, prompt, self.generation_params) if self.use_cache else None
+        if cache_key:
+            # The persistent tier is a SQLite read; every call shares this loop
+            cached = await loop.run_in_executor(None, self._cache.get, cache_key)
+            if cached is not None:
+                logger.info(f"LLM cache hit for {self.model_id} ({cache_key[:12]})")
+                yield cached
+                return
+
+        semantic_entry, cached = await self._semantic_lookup(prompt, semantic_key)
+        if cached is not None:
+            yield cached
+            return
+
+        # Rate limiting is charged per attempt with an estimate of the tokens,
+        # settled against the actual usage once the response is in. The
+        # estimate is not worth tokenizing the whole prompt for.
+        prompt_tokens = self._token_tracker.estimate_tokens(prompt)
+        estimated_tokens = prompt_tokens + self.completion_tokens_estimate
 
         # Error handling and retries
         max_retries = self._config.get("error_handling.max_retries", 3)
@@ -94,25 +220,136 @@ class LLM:
         backoff_factor = self._config.get("error_handling.backoff_factor", 2)
         attempt = 0
         while attempt < max_retries:
+            await self._rate_limiter.acquire(self.model_id, estimated_tokens)
+            publisher = StreamPublisher(project_name, self.model_id, self.stream_emit_interval)
+            chunks = []
+            usage = {}
+            abandoned = []
             try:
                 model_enum, model_name = self.model_enum(self.model_id)
                 if model_enum is None:
                     raise ValueError(f"Model {self.model_id} not supported")
-                if model_enum == "AZURE_OPENAI":
-                    client = AzureOpenAI()
-                    response = await client.inference(model_name, prompt)
+                if model_enum == "REPLAY":
+                    guard = contextlib.nullcontext()
+                    open_stream = functools.partial(self._cassette.replay, model_name, prompt, **self.generation_params)
+                elif model_enum == "AZURE_OPENAI":
+                    guard = CircuitBreaker.get("azure_openai").guard()
+                    open_stream = functools.partial(self._attempt, model_name, prompt, usage, abandoned)
                 else:
                     raise ValueError(f"Unsupported model enum: {model_enum}")
-                # Token/cost tracking
-                self._token_tracker.track_usage(self.model_id, prompt, response, {"project_name": project_name})
-                self._cache[cache_key] = response
-                return response
+                stream = with_deadline(
+                    self._hedging.stream(
+                        self.agent, prompt_tokens, open_stream,
+                        admit=functools.partial(self._admit_hedge, estimated_tokens)
+                    ),
+                    self.deadline, first_token_only=self.deadline_first_token_only
+                )
+                with guard:
+                    async for chunk in stream:
+                        chunks.append(chunk)
+                        publisher.push(chunk)
+                        yield chunk
+            except (CircuitOpenError, CassetteMissError):
+                # The backend is known to be down, or the prompt was never
+                # recorded: fail fast instead of retrying
+                self._rate_limiter.cancel(self.model_id, estimated_tokens)
+                raise
             except Exception as e:
                 logger.error(f"LLM inference error: {str(e)} (attempt {attempt+1})")
+                if isinstance(e, TimeoutError):
+                    DEADLINE_EXCEEDED.labels(agent=self.agent or "").inc()
+                if chunks:
+                    # Part of the response already reached the caller, a retry would repeat it
+                    publisher.close()
+                    raise
+                # The request failed, so none of the estimated tokens were used
+                self._rate_limiter.settle(self.model_id, estimated_tokens, 0)
                 await asyncio.sleep(retry_delay * (backoff_factor ** attempt))
                 attempt += 1
+                continue
+
+            publisher.close()
+            response = "".join(chunks)
+            # Usage and cache writes wait on the SQLite group commit, so they
+            # run on the executor rather than stall the other calls' streams
+            await loop.run_in_executor(
+                None, self._record_response, prompt, response, project_name, usage, estimated_tokens, cache_key,
+                abandoned
+            )
+            if semantic_entry:
+                self._semantic_cache.put(*semantic_entry, response)
+            return
         raise RuntimeError(f"LLM inference failed after {max_retries} attempts")
 
-    def inference(self, prompt: str, project_name: str) -> str:
-        """Blocking helper for synchronous callers (runs its own event loop)."""
-        return asyncio.run(self.ainference(prompt, project_name))
+    def _record_response(self, prompt: str, response: str, project_name: str, usage: dict,
+                         estimated_tokens: int, cache_key: Optional[str], abandoned: Optional[List[dict]] = None):
+        """Track the usage of a completed call and cache its response.
+
+        *abandoned* holds the usage of the attempts that were cancelled on
+        the way, i.e. a hedged request that lost its race. Their prompt was
+        still billed, so each is tracked (and its hedge reservation settled)
+        as a call without output.
+        """
+        try:
+            total_tokens = 0
+            for attempt_usage in abandoned or ():
+                call_data = self._token_tracker.track_usage(
+                    self.model_id, prompt, "", {"project_name": project_name}, usage=attempt_usage
+                )
+                tokens = call_data["total_tokens"] if call_data else estimated_tokens
+                self._rate_limiter.settle(self.model_id, estimated_tokens, tokens)
+                total_tokens += tokens
+            call_data = self._token_tracker.track_usage(
+                self.model_id, prompt, response, {"project_name": project_name}, usage=usage
+            )
+            self._rate_limiter.settle(
+                self.model_id, estimated_tokens,
+                call_data["total_tokens"] if call_data else estimated_tokens
+            )
+            if call_data:
+                total_tokens += call_data["total_tokens"]
+            if project_name and total_tokens:
+                self.update_global_token_usage(response, project_name, total_tokens)
+        except Exception as e:
+            logger.error(f"Token usage update failed: {str(e)}")
+        if cache_key:
+            self._cache.put(cache_key, self.model_id, response)
+
+    async def _attempt(self, model_name: str, prompt: str, usage: dict, abandoned: List[dict]) -> AsyncIterator[str]:
+        """Stream one request of a (possibly hedged) call with a usage of its own.
+
+        The usage is copied into *usage* once the request completes, and
+        added to *abandoned* if it is cancelled first.
+        """
+        attempt_usage = {}
+        try:
+            async for chunk in self._open_azure_stream(model_name, prompt, attempt_usage):
+                yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            abandoned.append(attempt_usage)
+            raise
+        usage.update(attempt_usage)
+
+    def _open_azure_stream(self, model_name: str, prompt: str, usage: dict) -> AsyncIterator[str]:
+        stream = AzureOpenAI().astream(model_name, prompt, usage=usage, **self.generation_params)
+        if self._cassette.recording:
+            stream = self._cassette.record(model_name, prompt, stream, **self.generation_params)
+        return stream
+
+    def _admit_hedge(self, estimated_tokens: int) -> bool:
+        # A hedge only goes out if the rate limit has room for it right away;
+        # queueing behind the limiter would defeat its purpose
+        if self._rate_limiter.reserve(self.model_id, estimated_tokens) > 0:
+            self._rate_limiter.cancel(self.model_id, estimated_tokens)
+            return False
+        return True
+
+    def inference(self, prompt: str, project_name: str, semantic_key: Optional[str] = None) -> str:
+        """Blocking helper for synchronous callers (runs on the shared background loop).
+
+        Agents opted into the semantic cache (``storage.cache.semantic.agents``)
+        pass the free-text part of *prompt* as *semantic_key*; a call whose key
+        means nearly the same as a cached one, in an otherwise identical
+        prompt, reuses its response.
+        """
+        return run_sync(self._ainference(prompt, project_name, semantic_key))
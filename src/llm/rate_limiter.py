@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from prometheus_client import Gauge, Histogram
+
+from src.config import Config
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_QUEUE_DEPTH = Gauge('llm_rate_limit_queue_depth', 'LLM calls waiting for rate limit capacity', ['model'])
+RATE_LIMIT_WAIT = Histogram('llm_rate_limit_wait_seconds', 'Time LLM calls waited for rate limit capacity', ['model'])
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at *rate* per second, up to *capacity*.
+
+    Capacity is reserved up front and the level may go negative: a caller
+    that finds the bucket in debt waits until its own reservation is paid
+    back. Each reservation adds to the debt, so callers are served in the
+    order they arrived.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take *amount* and return how many seconds the caller must wait for it."""
+        self._refill(now)
+        # A single call larger than the bucket would otherwise never fit
+        self.level -= min(amount, self.capacity)
+        return max(0.0, -self.level / self.rate)
+
+    def refund(self, amount: float, now: float):
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+
+
+class RateLimiter:
+    """Per-model limits on requests per minute and estimated tokens per minute.
+
+    Shared by every `LLM` instance, whichever thread or event loop it runs
+    on. Callers estimate a call's tokens before making it and settle the
+    difference once the actual usage is known.
+    """
+
+    def __init__(self, requests_per_minute: int = 60, tokens_per_minute: int = 90000,
+                 burst_size: int = 10, enabled: bool = True, overrides: Optional[Dict[str, dict]] = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.burst_size = burst_size
+        self.enabled = enabled
+        self.overrides = overrides or {}
+        self._buckets: Dict[str, Tuple[TokenBucket, TokenBucket]] = {}
+        self._waiting: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "RateLimiter":
+        config = Config()
+        return cls(
+            requests_per_minute=int(config.get("server.rate_limit.requests_per_minute", 60)),
+            tokens_per_minute=int(config.get("server.rate_limit.tokens_per_minute", 90000)),
+            burst_size=int(config.get("server.rate_limit.burst_size", 10)),
+            enabled=bool(config.get("server.rate_limit.enabled", True)),
+            overrides=config.get("server.rate_limit.models", {}) or {},
+        )
+
+    def _buckets_for(self, model: str) -> Tuple[TokenBucket, TokenBucket]:
+        buckets = self._buckets.get(model)
+        if buckets is None:
+            limits = self.overrides.get(model, {})
+            requests_per_minute = limits.get("requests_per_minute", self.requests_per_minute)
+            tokens_per_minute = limits.get("tokens_per_minute", self.tokens_per_minute)
+            burst_size = limits.get("burst_size", self.burst_size)
+            buckets = (
+                TokenBucket(requests_per_minute / 60, max(1, burst_size)),
+                TokenBucket(tokens_per_minute / 60, tokens_per_minute),
+            )
+            self._buckets[model] = buckets
+        return buckets
+
+    def reserve(self, model: str, tokens: int = 0) -> float:
+        """Reserve one request and *tokens* for *model*; return the seconds to wait before calling."""
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            requests, token_bucket = self._buckets_for(model)
+            return max(requests.reserve(1, now), token_bucket.reserve(tokens, now))
+
+    async def acquire(self, model: str, tokens: int = 0):
+        """Wait until *model* may be called with an estimated *tokens*."""
+        wait = self.reserve(model, tokens)
+        RATE_LIMIT_WAIT.labels(model=model).observe(wait)
+        if wait <= 0:
+            return
+
+        logger.info(f"LLM rate limit reached for {model}, waiting {wait:.2f}s")
+        self._track_waiting(model, 1)
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            # Give the capacity back so the callers queued behind are not delayed
+            self.cancel(model, tokens)
+            raise
+        finally:
+            self._track_waiting(model, -1)
+
+    def settle(self, model: str, estimated_tokens: int, actual_tokens: int):
+        """Correct a reservation of *estimated_tokens* once the call used *actual_tokens*."""
+        if not self.enabled or estimated_tokens == actual_tokens:
+            return
+        now = time.monotonic()
+        with self._lock:
+            token_bucket = self._buckets_for(model)[1]
+            if actual_tokens < estimated_tokens:
+                token_bucket.refund(estimated_tokens - actual_tokens, now)
+            else:
+                token_bucket.reserve(actual_tokens - estimated_tokens, now)
+
+    def cancel(self, model: str, tokens: int = 0):
+        """Return a reservation that was never used."""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            requests, token_bucket = self._buckets_for(model)
+            requests.refund(1, now)
+            token_bucket.refund(tokens, now)
+
+    def queue_depth(self, model: str) -> int:
+        with self._lock:
+            return self._waiting.get(model, 0)
+
+    def _track_waiting(self, model: str, delta: int):
+        with self._lock:
+            self._waiting[model] = self._waiting.get(model, 0) + delta
+            RATE_LIMIT_QUEUE_DEPTH.labels(model=model).set(self._waiting[model])
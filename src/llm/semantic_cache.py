@@ -0,0 +1,210 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from prometheus_client import Counter, Histogram
+
+from src.config import Config
+from .cache import cache_key
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_CACHE_LOOKUPS = Counter(
+    'llm_semantic_cache_lookups_total', 'Semantic LLM cache lookups', ['agent', 'result']
+)
+SEMANTIC_CACHE_SIMILARITY = Histogram(
+    'llm_semantic_cache_similarity', 'Cosine similarity of the nearest cached prompt per lookup', ['agent', 'result'],
+    buckets=(0.5, 0.7, 0.8, 0.85, 0.9, 0.92, 0.94, 0.95, 0.96, 0.97, 0.98, 0.99, 1.0)
+)
+
+DEFAULT_AGENTS = ("action", "decision", "answer", "researcher")
+
+# Separates the fixed part of a prompt from where its semantic key was, so
+# "ab" + key + "c" and "a" + key + "bc" do not share a namespace.
+KEY_PLACEHOLDER = "\x00"
+
+
+def _sentence_embedding(text: str) -> np.ndarray:
+    # Imported here: loading the sentence model is slow and only needed
+    # once an opted-in agent actually makes a call
+    from src.bert.sentence import SentenceBert
+    return SentenceBert().get_embedding(text)
+
+
+class _Namespace:
+    """Embeddings and responses cached for one prompt template."""
+
+    def __init__(self):
+        self.vectors: List[np.ndarray] = []
+        self.responses: List[str] = []
+        self.expires: List[float] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def append(self, vector: np.ndarray, response: str, expires_at: float):
+        self.vectors.append(vector)
+        self.responses.append(response)
+        self.expires.append(expires_at)
+        self._matrix = None
+
+    def drop_oldest(self, count: int = 1):
+        del self.vectors[:count]
+        del self.responses[:count]
+        del self.expires[:count]
+        self._matrix = None
+
+    def drop_expired(self, now: float) -> int:
+        # Entries share one ttl, so they expire in insertion order
+        expired = 0
+        while expired < len(self.expires) and self.expires[expired] <= now:
+            expired += 1
+        if expired:
+            self.drop_oldest(expired)
+        return expired
+
+    def nearest(self, vector: np.ndarray) -> Tuple[int, float]:
+        if self._matrix is None:
+            self._matrix = np.vstack(self.vectors)
+        similarities = self._matrix @ vector
+        index = int(np.argmax(similarities))
+        return index, float(similarities[index])
+
+
+class SemanticCache:
+    """Nearest-neighbour cache of LLM responses for prompts that mean the same thing.
+
+    A prompt is split into its template (everything but the *semantic key*,
+    the free-text input that varies between calls, e.g. the user's question)
+    and the key itself. Templates must match exactly; keys are compared by
+    the cosine similarity of their sentence embeddings, and the cached
+    response of the nearest key is returned when it reaches *threshold*.
+    Comparing only the varying text keeps a long shared prompt from making
+    every call look alike.
+
+    The index is an in-memory matrix per template, bounded to *max_entries*
+    entries overall (oldest first) that expire after *ttl* seconds. Every
+    lookup records the similarity it found, hit or miss, so the threshold
+    can be tuned from ``llm_semantic_cache_similarity``.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 2000, ttl: float = 3600,
+                 agents=DEFAULT_AGENTS, enabled: bool = True,
+                 embed: Callable[[str], np.ndarray] = _sentence_embedding,
+                 clock: Callable[[], float] = time.time):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.agents = set(agents or ())
+        self.enabled = enabled
+        self.embed_text = embed
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._hit_similarity = 0.0
+        self._entries = 0
+        self._namespaces: "OrderedDict[str, _Namespace]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "SemanticCache":
+        config = Config()
+        return cls(
+            threshold=float(config.get("storage.cache.semantic.threshold", 0.95)),
+            max_entries=int(config.get("storage.cache.semantic.max_entries", 2000)),
+            ttl=float(config.get("storage.cache.semantic.ttl", config.get("storage.cache.ttl", 3600))),
+            agents=config.get("storage.cache.semantic.agents", list(DEFAULT_AGENTS)),
+            enabled=bool(config.get("storage.cache.semantic.enabled", True)),
+        )
+
+    def enabled_for(self, agent: Optional[str]) -> bool:
+        return self.enabled and agent in self.agents
+
+    @staticmethod
+    def namespace(model_id: str, agent: str, prompt: str, semantic_key: str,
+                  params: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Return the namespace of *prompt* with *semantic_key* taken out, or None if it is not in the prompt."""
+        if not semantic_key or semantic_key not in prompt:
+            return None
+        template = prompt.replace(semantic_key, KEY_PLACEHOLDER)
+        return cache_key(model_id, template, {**(params or {}), "agent": agent})
+
+    def embed(self, text: str) -> Optional[np.ndarray]:
+        """Return the unit-length embedding of *text*, or None if it could not be computed."""
+        try:
+            vector = np.asarray(self.embed_text(text), dtype=np.float32).ravel()
+        except Exception as e:
+            logger.error(f"Semantic cache embedding failed: {str(e)}")
+            return None
+        norm = float(np.linalg.norm(vector)) if vector.size else 0.0
+        if not norm:
+            return None
+        return vector / norm
+
+    def get(self, namespace: str, vector: np.ndarray, agent: str = "") -> Optional[str]:
+        """Return the response cached for the nearest key of *namespace*, if similar enough."""
+        now = self.clock()
+        with self._lock:
+            entries = self._namespaces.get(namespace)
+            if entries is not None:
+                self._entries -= entries.drop_expired(now)
+                if not entries:
+                    del self._namespaces[namespace]
+            if not entries:
+                return self._miss(agent, None)
+            self._namespaces.move_to_end(namespace)
+            index, similarity = entries.nearest(vector)
+            if similarity < self.threshold:
+                return self._miss(agent, similarity)
+            self.hits += 1
+            self._hit_similarity += similarity
+            response = entries.responses[index]
+        SEMANTIC_CACHE_LOOKUPS.labels(agent=agent, result="hit").inc()
+        SEMANTIC_CACHE_SIMILARITY.labels(agent=agent, result="hit").observe(similarity)
+        logger.info(f"Semantic cache hit for {agent} (similarity {similarity:.3f})")
+        return response
+
+    def put(self, namespace: str, vector: np.ndarray, response: str):
+        with self._lock:
+            entries = self._namespaces.get(namespace)
+            if entries is None:
+                entries = self._namespaces[namespace] = _Namespace()
+            self._namespaces.move_to_end(namespace)
+            entries.append(vector, response, self.clock() + self.ttl)
+            self._entries += 1
+            # Evict from the least recently used templates first
+            while self._entries > self.max_entries:
+                oldest_key, oldest = next(iter(self._namespaces.items()))
+                oldest.drop_oldest()
+                self._entries -= 1
+                if not oldest:
+                    del self._namespaces[oldest_key]
+
+    def clear(self):
+        with self._lock:
+            self._namespaces.clear()
+            self._entries = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "mean_hit_similarity": self._hit_similarity / self.hits if self.hits else 0.0,
+                "entries": self._entries,
+                "namespaces": len(self._namespaces),
+                "threshold": self.threshold,
+            }
+
+    def _miss(self, agent: str, similarity: Optional[float]) -> None:
+        self.misses += 1
+        SEMANTIC_CACHE_LOOKUPS.labels(agent=agent, result="miss").inc()
+        if similarity is not None:
+            SEMANTIC_CACHE_SIMILARITY.labels(agent=agent, result="miss").observe(similarity)
+        return None
@@ -0,0 +1,61 @@
+import time
+import uuid
+from typing import List, Optional
+
+from prometheus_client import Histogram
+
+from src.socket_instance import emit_agent
+
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    'llm_time_to_first_token_seconds', 'Time from sending an LLM request to its first streamed token', ['model']
+)
+
+STREAM_CHANNEL = "llm-stream"
+
+
+class StreamPublisher:
+    """Forwards the partial text of one streamed completion to the UI.
+
+    Chunks are batched and emitted on the ``llm-stream`` channel at most
+    once every *interval* seconds, tagged with the project name so the UI
+    only shows the stream of the selected project. Each message carries the
+    offset of its delta in the full text, so a client can detect a gap.
+    """
+
+    def __init__(self, project_name: Optional[str], model: str, interval: float = 0.1):
+        self.project_name = project_name
+        self.model = model
+        self.interval = interval
+        self.stream_id = uuid.uuid4().hex
+        self.started = time.monotonic()
+        self.first_token_at: Optional[float] = None
+        self.offset = 0
+        self._pending: List[str] = []
+        self._last_emit = 0.0
+
+    def push(self, text: str):
+        now = time.monotonic()
+        if self.first_token_at is None:
+            self.first_token_at = now
+            LLM_TIME_TO_FIRST_TOKEN.labels(model=self.model).observe(now - self.started)
+        self._pending.append(text)
+        if now - self._last_emit >= self.interval:
+            self._flush(now, done=False)
+
+    def close(self):
+        """Emit whatever is pending and mark the stream as finished."""
+        self._flush(time.monotonic(), done=True)
+
+    def _flush(self, now: float, done: bool):
+        delta = "".join(self._pending)
+        self._pending.clear()
+        self._last_emit = now
+        if self.project_name:
+            emit_agent(STREAM_CHANNEL, {
+                "project_name": self.project_name,
+                "stream_id": self.stream_id,
+                "offset": self.offset,
+                "delta": delta,
+                "done": done,
+            }, False)
+        self.offset += len(delta)
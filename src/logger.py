@@ -63,7 +63,7 @@ def route_logger(logger: Logger):
             # Log exit point, including response summary if possible
             try:
                 if log_enabled:
-                    if isinstance(response, Response) and response.direct_passthrough:
+                    if isinstance(response, Response) and (response.direct_passthrough or response.is_streamed):
                         logger.debug(f"{request.path} {request.method} - Response: File response")
                     else:
                         response_summary = response.get_data(as_text=True)
@@ -1,7 +1,7 @@
 from typing import Optional
-from sqlmodel import Field, Session, SQLModel, create_engine
+from sqlmodel import Field, SQLModel
 
-from src.config import Config
+from src.storage import get_engine, session_factory
 
 """
 TODO: The tag check should be a BM25 search, it's just a simple equality check now.
@@ -14,19 +14,17 @@ class Knowledge(SQLModel, table=True):
 
 class KnowledgeBase:
     def __init__(self):
-        config = Config()
-        sqlite_path = config.get_sqlite_db()
-        self.engine = create_engine(f"sqlite:///{sqlite_path}")
-        SQLModel.metadata.create_all(self.engine)
+        self.engine = get_engine()
+        self.session_factory = session_factory()
 
     def add_knowledge(self, tag: str, contents: str):
         knowledge = Knowledge(tag=tag, contents=contents)
-        with Session(self.engine) as session:
+        with self.session_factory() as session:
             session.add(knowledge)
             session.commit()
 
     def get_knowledge(self, tag: str) -> str:
-        with Session(self.engine) as session:
+        with self.session_factory() as session:
             knowledge = session.query(Knowledge).filter(Knowledge.tag == tag).first()
             if knowledge:
                 return knowledge.contents
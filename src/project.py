@@ -1,26 +1,102 @@
 import os
 import json
+import glob
+import fnmatch
+import hashlib
+import logging
+import threading
 import zipfile
+from collections import OrderedDict
 from datetime import datetime
 from typing import Optional
+from sqlalchemy import func, insert, literal, select
 from src.socket_instance import emit_agent
-from sqlmodel import Field, Session, SQLModel, create_engine
+from sqlmodel import Field, Index, Session, SQLModel
 from src.config import Config
+from src.storage import get_engine, migrate_once, run_write, session_factory
 
 
 class Projects(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     project: str
+    # Legacy JSON message stack, emptied once its messages are moved to `messages`
     message_stack_json: str
 
 
+class Message(SQLModel, table=True):
+    """One chat message of a project, ordered by a per-project sequence number."""
+    __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_project_seq", "project", "seq", unique=True),
+        Index("ix_messages_project_from_agent_seq", "project", "from_agent", "seq"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    project: str
+    seq: int
+    from_agent: bool
+    text: Optional[str] = None
+    timestamp: str
+
+# Generated or vendored content that is never shown in the editor
+DEFAULT_IGNORED_FILES = [
+    ".git", "node_modules", "__pycache__", ".venv", "venv", "env", ".mypy_cache",
+    ".pytest_cache", ".ruff_cache", ".next", ".cache", "dist", "build",
+    "*.pyc", "*.pyo", "*.so", "*.dll", "*.exe", ".DS_Store",
+]
+
+# Formats that are already compressed and only get stored in project archives
+COMPRESSED_EXTENSIONS = {
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar", ".jar", ".whl",
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".ico", ".mp3", ".mp4", ".webm",
+    ".ogg", ".woff", ".woff2", ".pdf", ".lockb",
+}
+
+ARCHIVE_CHUNK_SIZE = 64 * 1024
+
+
+class _ArchiveSink:
+    """Write-only, unseekable file object that buffers zip output between yields.
+
+    zipfile falls back to streaming mode (data descriptors) for such objects,
+    so an archive can be sent while later files are still being compressed.
+    Everything written is also copied to *tee* to fill the archive cache.
+    """
+
+    def __init__(self, tee=None):
+        self.buffer = bytearray()
+        self.tee = tee
+
+    def write(self, data):
+        self.buffer += data
+        if self.tee:
+            self.tee.write(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
 class ProjectManager:
+    # (path) -> (size, mtime_ns, sha256, is_binary), shared by all instances so
+    # unchanged files are never re-read to build a manifest. Bounded to
+    # `storage.project_files.hash_cache_size` paths, least recently used first.
+    _file_hashes: "OrderedDict[str, tuple]" = OrderedDict()
+    _file_hashes_lock = threading.Lock()
+    logger = logging.getLogger(__name__)
+
     def __init__(self):
         config = Config()
-        sqlite_path = config.get_sqlite_db()
         self.project_path = config.get_projects_dir()
-        self.engine = create_engine(f"sqlite:///{sqlite_path}")
-        SQLModel.metadata.create_all(self.engine)
+        self.hash_cache_size = int(config.get("storage.project_files.hash_cache_size", 10000))
+        self.engine = get_engine()
+        self.session_factory = session_factory()
+        migrate_once(self.engine, "project_messages", self._migrate_message_stacks)
 
     def new_message(self):
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -31,32 +107,81 @@ class ProjectManager:
             "timestamp": timestamp
         }
 
-    def create_project(self, project: str):
-        with Session(self.engine) as session:
-            project_state = Projects(project=project, message_stack_json=json.dumps([]))
-            session.add(project_state)
+    @staticmethod
+    def _to_message(row: Message) -> dict:
+        return {
+            "from_agent": row.from_agent,
+            "message": row.text,
+            "timestamp": row.timestamp,
+            "seq": row.seq
+        }
+
+    @staticmethod
+    def _insert_message(session: Session, project: str, message: dict) -> int:
+        """Insert *message* with the next sequence number of *project* and return it.
+
+        The sequence number is computed inside the INSERT itself so concurrent
+        writers can never hand out the same number twice.
+        """
+        next_seq = select(
+            literal(project),
+            func.coalesce(func.max(Message.seq), 0) + 1,
+            literal(bool(message.get("from_agent"))),
+            literal(message.get("message")),
+            literal(message.get("timestamp") or datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+        ).where(Message.project == project)
+        return session.execute(
+            insert(Message)
+            .from_select(["project", "seq", "from_agent", "text", "timestamp"], next_seq)
+            .returning(Message.seq)
+        ).scalar_one()
+
+    def _migrate_message_stacks(self):
+        """Move messages kept in the legacy ``message_stack_json`` column into ``messages``."""
+        with self.session_factory() as session:
+            legacy_rows = session.query(Projects).filter(
+                Projects.message_stack_json.not_in(["", "[]"])
+            ).order_by(Projects.id).all()
+            if not legacy_rows:
+                return
+            for row in legacy_rows:
+                already_migrated = session.query(Message.id).filter(Message.project == row.project).first()
+                if not already_migrated:
+                    for message in json.loads(row.message_stack_json):
+                        self._insert_message(session, row.project, message)
+                row.message_stack_json = json.dumps([])
             session.commit()
 
+    def _project_exists(self, session: Session, project: str) -> bool:
+        return session.query(Projects.id).filter(Projects.project == project).first() is not None
+
+    def _latest_message(self, project: str, from_agent: Optional[bool] = None):
+        with self.session_factory() as session:
+            query = session.query(Message).filter(Message.project == project)
+            if from_agent is not None:
+                query = query.filter(Message.from_agent == from_agent)
+            return query.order_by(Message.seq.desc()).first()
+
+    def create_project(self, project: str):
+        run_write(lambda session: session.add(Projects(project=project, message_stack_json=json.dumps([]))))
+
     def delete_project(self, project: str):
-        with Session(self.engine) as session:
+        def operation(session: Session):
             project_state = session.query(Projects).filter(Projects.project == project).first()
             if project_state:
                 session.delete(project_state)
-                session.commit()
+            session.query(Message).filter(Message.project == project).delete()
 
-    def add_message_to_project(self, project: str, message: dict):
-        with Session(self.engine) as session:
-            project_state = session.query(Projects).filter(Projects.project == project).first()
-            if project_state:
-                message_stack = json.loads(project_state.message_stack_json)
-                message_stack.append(message)
-                project_state.message_stack_json = json.dumps(message_stack)
-                session.commit()
-            else:
-                message_stack = [message]
-                project_state = Projects(project=project, message_stack_json=json.dumps(message_stack))
-                session.add(project_state)
-                session.commit()
+        run_write(operation)
+        self._forget_file_hashes(project)
+
+    def add_message_to_project(self, project: str, message: dict) -> int:
+        def operation(session: Session):
+            if not self._project_exists(session, project):
+                session.add(Projects(project=project, message_stack_json=json.dumps([])))
+            return self._insert_message(session, project, message)
+
+        return run_write(operation)
 
     def add_message_from_agent(self, project: str, message: str):
         """Persist a message generated by the agent and broadcast it via Socket.IO."""
@@ -64,70 +189,67 @@ class ProjectManager:
         new_message["message"] = message
         new_message["from_agent"] = True  # correctly flag as agent-generated
 
-        # Emit to frontend and store in DB
+        # Store in DB and emit to frontend
+        new_message["seq"] = self.add_message_to_project(project, new_message)
         emit_agent("server-message", {"messages": new_message})
-        self.add_message_to_project(project, new_message)
 
     def add_message_from_user(self, project: str, message: str):
         new_message = self.new_message()
         new_message["message"] = message
         new_message["from_agent"] = False
+        new_message["seq"] = self.add_message_to_project(project, new_message)
         emit_agent("server-message", {"messages": new_message})
-        self.add_message_to_project(project, new_message)
 
-    def get_messages(self, project: str):
-        with Session(self.engine) as session:
-            project_state = session.query(Projects).filter(Projects.project == project).first()
-            if project_state:
-                return json.loads(project_state.message_stack_json)
-            return None
+    def get_messages(self, project: str, since: Optional[int] = None, limit: Optional[int] = None):
+        """Return the messages of *project* in chronological order.
+
+        With *since*, only messages whose ``seq`` is greater than it are
+        returned (oldest first, at most *limit*); without it, *limit* keeps the
+        newest messages. Returns None if the project does not exist.
+        """
+        with self.session_factory() as session:
+            query = session.query(Message).filter(Message.project == project)
+            if since is not None:
+                query = query.filter(Message.seq > since).order_by(Message.seq)
+                rows = query.limit(limit).all() if limit else query.all()
+            elif limit:
+                rows = list(reversed(query.order_by(Message.seq.desc()).limit(limit).all()))
+            else:
+                rows = query.order_by(Message.seq).all()
+
+            if not rows and not self._project_exists(session, project):
+                return None
+            return [self._to_message(row) for row in rows]
 
     def get_latest_message_from_user(self, project: str):
-        with Session(self.engine) as session:
-            project_state = session.query(Projects).filter(Projects.project == project).first()
-            if project_state:
-                message_stack = json.loads(project_state.message_stack_json)
-                for message in reversed(message_stack):
-                    if not message["from_agent"]:
-                        return message
-            return None
+        row = self._latest_message(project, from_agent=False)
+        return self._to_message(row) if row else None
 
     def validate_last_message_is_from_user(self, project: str):
-        with Session(self.engine) as session:
-            project_state = session.query(Projects).filter(Projects.project == project).first()
-            if project_state:
-                message_stack = json.loads(project_state.message_stack_json)
-                if message_stack:
-                    return not message_stack[-1]["from_agent"]
-            return False
+        row = self._latest_message(project)
+        return bool(row) and not row.from_agent
 
     def get_latest_message_from_agent(self, project: str):
-        with Session(self.engine) as session:
-            project_state = session.query(Projects).filter(Projects.project == project).first()
-            if project_state:
-                message_stack = json.loads(project_state.message_stack_json)
-                for message in reversed(message_stack):
-                    if message["from_agent"]:
-                        return message
-            return None
+        row = self._latest_message(project, from_agent=True)
+        return self._to_message(row) if row else None
 
     def get_project_list(self):
-        with Session(self.engine) as session:
+        with self.session_factory() as session:
             projects = session.query(Projects).all()
             return [project.project for project in projects]
 
     def get_all_messages_formatted(self, project: str):
         formatted_messages = []
 
-        with Session(self.engine) as session:
-            project_state = session.query(Projects).filter(Projects.project == project).first()
-            if project_state:
-                message_stack = json.loads(project_state.message_stack_json)
-                for message in message_stack:
-                    if message["from_agent"]:
-                        formatted_messages.append(f"Agent: {message['message']}")
-                    else:
-                        formatted_messages.append(f"User: {message['message']}")
+        with self.session_factory() as session:
+            rows = session.query(Message.from_agent, Message.text).filter(
+                Message.project == project
+            ).order_by(Message.seq).all()
+            for from_agent, text in rows:
+                if from_agent:
+                    formatted_messages.append(f"Agent: {text}")
+                else:
+                    formatted_messages.append(f"User: {text}")
 
             return formatted_messages
 
@@ -148,36 +270,214 @@ class ProjectManager:
 
     def get_zip_path(self, project: str):
         return f"{self.get_project_path(project)}.zip"
+
+    def _iter_archive_files(self, project: str):
+        """Yield (path, arcname) of every file in the project, in a stable order."""
+        project_path = self.get_project_path(project)
+        for root, dirs, files in os.walk(project_path):
+            dirs.sort()
+            for file in sorted(files):
+                full_path = os.path.join(root, file)
+                yield full_path, os.path.relpath(full_path, os.path.join(project_path, '..'))
+
+    def get_project_digest(self, project: str) -> str:
+        """Digest of the project's file list, sizes and modification times.
+
+        Any write to a project file changes it, so it keys the archive cache
+        without reading file contents.
+        """
+        digest = hashlib.sha256()
+        for full_path, arcname in self._iter_archive_files(project):
+            stat = os.stat(full_path)
+            digest.update(f"{arcname}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+        return digest.hexdigest()
+
+    def _archive_path(self, project: str, digest: str, store_only: bool) -> str:
+        archive_dir = Config().get("storage.archive_cache_dir", "data/archives")
+        os.makedirs(archive_dir, exist_ok=True)
+        name = os.path.basename(self.get_project_path(project))
+        mode = "store" if store_only else "deflate"
+        return os.path.join(archive_dir, f"{name}.{mode}.{digest[:16]}.zip")
+
+    def get_cached_archive(self, project: str, store_only: bool = False):
+        """Return ``(path, digest)``; *path* is None if no archive of the current content is cached."""
+        digest = self.get_project_digest(project)
+        path = self._archive_path(project, digest, store_only)
+        return (path if os.path.exists(path) else None), digest
+
+    def stream_project_zip(self, project: str, store_only: bool = False, digest: str = None):
+        """Yield a zip archive of the project chunk by chunk while it is being built.
+
+        Already-compressed formats are stored rather than deflated, and
+        *store_only* stores every file. The archive is written to the cache
+        as it streams and published only once complete.
+        """
+        digest = digest or self.get_project_digest(project)
+        archive_path = self._archive_path(project, digest, store_only)
+        partial_path = f"{archive_path}.{threading.get_ident()}.part"
+
+        try:
+            with open(partial_path, "wb") as cache_file:
+                sink = _ArchiveSink(tee=cache_file)
+                with zipfile.ZipFile(sink, "w") as zipf:
+                    for full_path, arcname in self._iter_archive_files(project):
+                        info = zipfile.ZipInfo.from_file(full_path, arcname)
+                        extension = os.path.splitext(arcname)[1].lower()
+                        if store_only or extension in COMPRESSED_EXTENSIONS:
+                            info.compress_type = zipfile.ZIP_STORED
+                        else:
+                            info.compress_type = zipfile.ZIP_DEFLATED
+                        with open(full_path, "rb") as source, \
+                                zipf.open(info, "w", force_zip64=info.file_size > zipfile.ZIP64_LIMIT) as target:
+                            for chunk in iter(lambda: source.read(ARCHIVE_CHUNK_SIZE), b""):
+                                target.write(chunk)
+                                if len(sink.buffer) >= ARCHIVE_CHUNK_SIZE:
+                                    yield sink.drain()
+                        if sink.buffer:
+                            yield sink.drain()
+                yield sink.drain()
+        except BaseException:
+            # Client went away or a file vanished: never publish a partial archive
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+
+        os.replace(partial_path, archive_path)
+        for stale in glob.glob(archive_path.rsplit(".", 2)[0] + ".*.zip"):
+            if stale != archive_path:
+                os.remove(stale)
     
-    def get_project_files(self, project_name: str):
+    def get_project_directory(self, project_name: str):
+        """Return the absolute directory of *project_name*, or None if it does not exist."""
         if not project_name:
-            return []
+            return None
 
-        project_directory = "-".join(project_name.split(" "))
         base_path = os.path.abspath(os.path.join(os.getcwd(), 'data', 'projects'))
-        directory = os.path.join(base_path, project_directory)
+        directory = self._project_path(project_name)
 
         # Ensure the directory is within the allowed base path
         if not os.path.exists(directory) or not os.path.commonprefix([directory, base_path]) == base_path:
-            return []
+            return None
+        return directory
 
-        files = []
-        for root, _, filenames in os.walk(directory):
-            for filename in filenames:
-                file_relative_path = os.path.relpath(root, directory)
-                if file_relative_path == '.':
-                    file_relative_path = ''
-                file_path = os.path.join(file_relative_path, filename)
+    @staticmethod
+    def _project_path(project_name: str) -> str:
+        project_directory = "-".join(project_name.split(" "))
+        return os.path.join(os.path.abspath(os.path.join(os.getcwd(), 'data', 'projects')), project_directory)
+
+    def _forget_file_hashes(self, project_name: str):
+        """Drop the cached hashes of every file of *project_name*."""
+        prefix = self._project_path(project_name) + os.sep
+        with self._file_hashes_lock:
+            for path in [path for path in self._file_hashes if path.startswith(prefix)]:
+                del self._file_hashes[path]
+
+    @staticmethod
+    def _is_ignored(name: str, patterns) -> bool:
+        return any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+    def _hash_file(self, path: str, stat: os.stat_result):
+        """Return (sha256, is_binary) of *path*, reusing the last result if it is unchanged."""
+        with self._file_hashes_lock:
+            cached = self._file_hashes.get(path)
+            if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+                self._file_hashes.move_to_end(path)
+                return cached[2], cached[3]
+
+        digest = hashlib.sha256()
+        is_binary = False
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(64 * 1024), b''):
+                if not is_binary and b'\0' in chunk:
+                    is_binary = True
+                digest.update(chunk)
+        file_hash = digest.hexdigest()
+        with self._file_hashes_lock:
+            self._file_hashes[path] = (stat.st_size, stat.st_mtime_ns, file_hash, is_binary)
+            self._file_hashes.move_to_end(path)
+            while len(self._file_hashes) > self.hash_cache_size:
+                self._file_hashes.popitem(last=False)
+        return file_hash, is_binary
+
+    def get_project_manifest(self, project_name: str) -> dict:
+        """List the files of a project with their size, mtime and content hash.
+
+        Paths matching ``storage.project_files.ignore`` (generated folders like
+        node_modules or virtualenvs) are not walked, and files larger than
+        ``storage.project_files.max_file_size`` are reported under "skipped".
+        """
+        directory = self.get_project_directory(project_name)
+        if directory is None:
+            return {"files": [], "skipped": []}
+
+        config = Config()
+        ignore = config.get("storage.project_files.ignore", DEFAULT_IGNORED_FILES)
+        max_file_size = config.get("storage.project_files.max_file_size", 1024 * 1024)
+
+        files, skipped = [], []
+        for root, dirs, filenames in os.walk(directory):
+            dirs[:] = sorted(d for d in dirs if not self._is_ignored(d, ignore))
+            for filename in sorted(filenames):
+                if self._is_ignored(filename, ignore):
+                    continue
+                full_path = os.path.join(root, filename)
+                file_path = os.path.relpath(full_path, directory)
                 try:
-                    with open(os.path.join(root, filename), 'r') as file:
-                        files.append({
-                            "file": file_path,
-                            "code": file.read()
-                        })
-                except Exception as e:
-                    print(f"Error reading file {filename}: {e}")
-        return files
+                    stat = os.stat(full_path)
+                    if stat.st_size > max_file_size:
+                        skipped.append({"file": file_path, "size": stat.st_size, "reason": "too_large"})
+                        continue
+                    file_hash, is_binary = self._hash_file(full_path, stat)
+                except OSError as e:
+                    self.logger.error(f"Error reading file {filename}: {e}")
+                    continue
+                files.append({
+                    "file": file_path,
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                    "hash": file_hash,
+                    "binary": is_binary
+                })
+        return {"files": files, "skipped": skipped}
+
+    def read_project_file(self, project_name: str, file_path: str):
+        """Return ``{"file", "code", "hash"}`` for one text file of a project.
 
+        Returns None if the file does not exist, lies outside the project,
+        is ignored, too large or binary.
+        """
+        directory = self.get_project_directory(project_name)
+        if directory is None or not file_path:
+            return None
+
+        full_path = os.path.abspath(os.path.join(directory, file_path))
+        if os.path.commonpath([full_path, directory]) != directory or not os.path.isfile(full_path):
+            return None
+
+        config = Config()
+        ignore = config.get("storage.project_files.ignore", DEFAULT_IGNORED_FILES)
+        relative_path = os.path.relpath(full_path, directory)
+        if any(self._is_ignored(part, ignore) for part in relative_path.split(os.sep)):
+            return None
+
+        stat = os.stat(full_path)
+        if stat.st_size > config.get("storage.project_files.max_file_size", 1024 * 1024):
+            return None
+        file_hash, is_binary = self._hash_file(full_path, stat)
+        if is_binary:
+            return None
+        with open(full_path, 'r', encoding='utf-8', errors='replace') as file:
+            return {"file": relative_path, "code": file.read(), "hash": file_hash}
+
+    def get_project_files(self, project_name: str):
+        files = []
+        for entry in self.get_project_manifest(project_name)["files"]:
+            if entry["binary"]:
+                continue
+            content = self.read_project_file(project_name, entry["file"])
+            if content:
+                files.append({"file": content["file"], "code": content["code"]})
+        return files
 
 if __name__ == "__main__":
     # Real, practical example usage of the ProjectManager
@@ -0,0 +1,158 @@
+import hashlib
+import logging
+import os
+from functools import lru_cache
+from typing import Dict, List
+
+from prometheus_client import Counter
+
+from src.config import Config
+
+logger = logging.getLogger(__name__)
+
+PROMPT_TOKENS_DROPPED = Counter('prompt_tokens_dropped_total', 'Tokens left out of prompts to fit their budget', ['agent', 'slot'])
+
+DEFAULT_BUDGETS = {"conversation": 4000, "code_markdown": 16000}
+
+
+@lru_cache(maxsize=1)
+def _default_encoding():
+    import tiktoken
+    return tiktoken.get_encoding("cl100k_base")
+
+
+class PromptBudget:
+    """Fits the variable slots of one agent prompt into per-slot token budgets.
+
+    Budgets come from ``prompt_budget.default`` overlaid with
+    ``prompt_budget.agents.<agent>``. Conversations keep their newest
+    messages; code keeps error-referenced and recently edited files first
+    and elides the middle of files that do not fit whole. Every text is
+    tokenized at most once per budget, and the tokens dropped from each
+    slot are recorded in `dropped`.
+    """
+
+    def __init__(self, agent: str, budgets: Dict[str, int], min_elided_tokens: int = 200, encoding=None):
+        self.agent = agent
+        self.budgets = budgets
+        self.min_elided_tokens = min_elided_tokens
+        self.encoding = encoding or _default_encoding()
+        self.dropped: Dict[str, int] = {}
+        # Token lists by text hash, kept for the life of the budget so the
+        # texts that get elided after being counted are not encoded again
+        self._tokens: Dict[str, list] = {}
+
+    @classmethod
+    def for_agent(cls, agent: str, encoding=None) -> "PromptBudget":
+        config = Config()
+        budgets = dict(DEFAULT_BUDGETS)
+        budgets.update(config.get("prompt_budget.default", {}) or {})
+        budgets.update(config.get(f"prompt_budget.agents.{agent}", {}) or {})
+        return cls(
+            agent,
+            budgets,
+            min_elided_tokens=int(config.get("prompt_budget.min_elided_tokens", 200)),
+            encoding=encoding
+        )
+
+    def count(self, text: str) -> int:
+        return len(self._encode(text))
+
+    def _encode(self, text: str) -> list:
+        key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        tokens = self._tokens.get(key)
+        if tokens is None:
+            tokens = self._tokens[key] = self.encoding.encode(text)
+        return tokens
+
+    def elide(self, text: str, max_tokens: int) -> str:
+        """Keep the start and end of *text* within *max_tokens*, replacing the middle with a marker."""
+        tokens = self._encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        half = max(1, max_tokens // 2)
+        elided = len(tokens) - 2 * half
+        return (
+            self.encoding.decode(tokens[:half])
+            + f"\n... [{elided} tokens elided] ...\n"
+            + self.encoding.decode(tokens[-half:])
+        )
+
+    def fit_messages(self, slot: str, messages: List[str]) -> List[str]:
+        """Keep the newest *messages* that fit the budget of *slot*, in their original order."""
+        budget = self.budgets.get(slot)
+        if budget is None:
+            return messages
+
+        already_dropped = self.dropped.get(slot, 0)
+        kept = []
+        remaining = budget
+        for index in range(len(messages) - 1, -1, -1):
+            tokens = self.count(messages[index])
+            if tokens <= remaining:
+                kept.append(messages[index])
+                remaining -= tokens
+                continue
+            if kept:
+                self._drop(slot, tokens)
+            else:
+                # The latest message alone is over budget: keep what fits of it
+                kept.append(self.elide(messages[index], budget))
+                self._drop(slot, tokens - budget)
+            self._drop(slot, sum(self.count(message) for message in messages[:index]))
+            break
+        kept.reverse()
+        self._report(slot, self.dropped.get(slot, 0) - already_dropped)
+        return kept
+
+    def fit_code(self, slot: str, files: List[dict], error: str = "") -> str:
+        """Render *files* (``filename``/``code`` dicts) as markdown within the budget of *slot*.
+
+        Files whose name appears in *error* come first, then the most
+        recently modified ones. A file that does not fit whole is elided if
+        enough budget is left, otherwise it is only listed by name.
+        """
+        budget = self.budgets.get(slot)
+        already_dropped = self.dropped.get(slot, 0)
+        ordered = sorted(files, key=lambda file: (not self._referenced(file["filename"], error), -file.get("mtime", 0)))
+
+        markdown = ""
+        omitted = []
+        remaining = budget
+        for file in ordered:
+            header = f"### {file['filename']}:\n\n"
+            code = file["code"]
+            if budget is not None:
+                overhead = self.count(header) + 8
+                tokens = self.count(code)
+                if tokens + overhead > remaining:
+                    room = remaining - overhead
+                    if room < self.min_elided_tokens:
+                        omitted.append(file["filename"])
+                        self._drop(slot, tokens)
+                        continue
+                    code = self.elide(code, room)
+                    self._drop(slot, tokens - room)
+                    tokens = room
+                remaining -= tokens + overhead
+            markdown += header
+            markdown += f"```\n{code}\n```\n\n"
+            markdown += "---\n\n"
+
+        if omitted:
+            markdown += "Files left out to fit the context: " + ", ".join(omitted) + "\n"
+        self._report(slot, self.dropped.get(slot, 0) - already_dropped)
+        return markdown
+
+    @staticmethod
+    def _referenced(filename: str, error: str) -> bool:
+        return bool(error) and os.path.basename(filename) in error
+
+    def _drop(self, slot: str, tokens: int):
+        if tokens > 0:
+            self.dropped[slot] = self.dropped.get(slot, 0) + tokens
+
+    def _report(self, slot: str, dropped: int):
+        if dropped:
+            PROMPT_TOKENS_DROPPED.labels(agent=self.agent, slot=slot).inc(dropped)
+            logger.info(f"Prompt budget for {self.agent}: dropped {dropped} tokens from {slot}")
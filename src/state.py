@@ -1,13 +1,29 @@
+import copy
 import json
-import os
+import threading
+from collections import OrderedDict
 from datetime import datetime
 from typing import Optional
-from sqlmodel import Field, Session, SQLModel, create_engine
+from prometheus_client import Counter
+from sqlalchemy import event, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Field, Session, SQLModel
 from src.socket_instance import emit_agent
 from src.config import Config
+from src.storage import get_engine, migrate_once, run_write, session_factory
+
+STATE_CACHE_HITS = Counter('agent_state_cache_hits_total', 'Latest agent state reads served from memory')
+STATE_CACHE_MISSES = Counter('agent_state_cache_misses_total', 'Latest agent state reads that went to SQLite')
+
+
+# Keys of a state entry that describe the *latest* entry and are mutated in
+# place by the agent (flags and counters). They live in columns rather than
+# in the JSON payload so they can be updated without re-serializing anything.
+FLAG_KEYS = ("agent_is_active", "completed", "token_usage")
 
 
 class AgentStateModel(SQLModel, table=True):
+    """Legacy single-blob state stack, only read to migrate old databases."""
     __tablename__ = "agent_state"
 
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -15,16 +31,141 @@ class AgentStateModel(SQLModel, table=True):
     state_stack_json: str
 
 
+class AgentStateHeader(SQLModel, table=True):
+    """One row per project holding the sequence number and flags of the latest entry."""
+    __tablename__ = "agent_state_header"
+
+    project: str = Field(primary_key=True)
+    latest_seq: int = 0
+    agent_is_active: bool = True
+    completed: bool = False
+    token_usage: int = 0
+
+
+class AgentStateEntry(SQLModel, table=True):
+    """One row per state entry, keyed by project and sequence number.
+
+    The flag columns of the latest entry are only authoritative once a newer
+    entry is appended; until then the header row holds the live values.
+    """
+    __tablename__ = "agent_state_entry"
+
+    project: str = Field(primary_key=True)
+    seq: int = Field(primary_key=True)
+    state_json: str
+    agent_is_active: bool = True
+    completed: bool = False
+    token_usage: int = 0
+
+
+class TokenUsageCounter(SQLModel, table=True):
+    """Running total of tokens used by a project, updated with a single atomic upsert."""
+    __tablename__ = "token_usage"
+
+    project: str = Field(primary_key=True)
+    tokens: int = 0
+
+
+class LatestStateCache:
+    """Process-wide write-through cache of the latest state entry of each project.
+
+    Writers update it from inside their write transaction, so it follows the
+    order in which writes hit the database. Readers that miss fill it only if
+    no write happened while they were reading, which keeps a slow read from
+    overwriting a newer value. A project without state is cached as None.
+    """
+
+    def __init__(self, max_projects: int = 256):
+        self.max_projects = max_projects
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, project: str):
+        """Return ``(hit, state)``; *state* is a private copy, or None if the project has no state."""
+        with self._lock:
+            if project not in self._entries:
+                self.misses += 1
+                STATE_CACHE_MISSES.inc()
+                return False, None
+            self._entries.move_to_end(project)
+            self.hits += 1
+            STATE_CACHE_HITS.inc()
+            return True, copy.deepcopy(self._entries[project])
+
+    def get_field(self, project: str, key: str):
+        """Return ``(hit, value)`` for one field of the cached state, without copying it."""
+        with self._lock:
+            if project not in self._entries:
+                self.misses += 1
+                STATE_CACHE_MISSES.inc()
+                return False, None
+            self._entries.move_to_end(project)
+            self.hits += 1
+            STATE_CACHE_HITS.inc()
+            state = self._entries[project]
+            return True, state[key] if state else None
+
+    def generation(self, project: str) -> int:
+        with self._lock:
+            return self._generations.get(project, 0)
+
+    def fill(self, project: str, generation: int, state: Optional[dict]):
+        """Cache *state* read from the database, unless a write happened since *generation*."""
+        with self._lock:
+            if self._generations.get(project, 0) == generation:
+                self._store(project, copy.deepcopy(state))
+
+    def put(self, project: str, state: Optional[dict]):
+        with self._lock:
+            self._bump(project)
+            self._store(project, copy.deepcopy(state))
+
+    def update(self, project: str, **fields):
+        """Apply *fields* to the cached state of *project*, dropping it if it is not cached."""
+        with self._lock:
+            self._bump(project)
+            state = self._entries.get(project)
+            if state is None:
+                self._entries.pop(project, None)
+                return
+            for key, value in fields.items():
+                state[key] = value
+
+    def invalidate(self, project: str):
+        with self._lock:
+            self._bump(project)
+            self._entries.pop(project, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "projects": len(self._entries)
+            }
+
+    def _bump(self, project: str):
+        self._generations[project] = self._generations.get(project, 0) + 1
+
+    def _store(self, project: str, state: Optional[dict]):
+        self._entries[project] = state
+        self._entries.move_to_end(project)
+        while len(self._entries) > self.max_projects:
+            self._entries.popitem(last=False)
+
+
 class AgentState:
+    _cache = LatestStateCache(Config().get("storage.state_cache.max_projects", 256))
+
     def __init__(self):
-        config = Config()
-        sqlite_path = config.get_sqlite_db()
-        # Ensure the directory for the SQLite database exists
-        db_dir = os.path.dirname(sqlite_path)
-        if db_dir and not os.path.exists(db_dir):
-            os.makedirs(db_dir, exist_ok=True)
-        self.engine = create_engine(f"sqlite:///{sqlite_path}")
-        SQLModel.metadata.create_all(self.engine)
+        self.engine = get_engine()
+        self.session_factory = session_factory()
+        migrate_once(self.engine, "agent_state_entries", self._migrate_legacy_states)
 
     def new_state(self):
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -48,136 +189,327 @@ class AgentState:
             "timestamp": timestamp
         }
 
-    def create_state(self, project: str):
-        with Session(self.engine) as session:
-            new_state = self.new_state()
-            new_state["step"] = 1
-            new_state["internal_monologue"] = "I'm starting the work..."
-            agent_state = AgentStateModel(project=project, state_stack_json=json.dumps([new_state]))
-            session.add(agent_state)
+    # ------------------------------------------------------------------
+    # Storage helpers
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _split_state(state: dict) -> dict:
+        """Split a state dict into the column values of an AgentStateEntry."""
+        payload = {key: value for key, value in state.items() if key not in FLAG_KEYS}
+        return {
+            "state_json": json.dumps(payload),
+            "agent_is_active": bool(state.get("agent_is_active", True)),
+            "completed": bool(state.get("completed", False)),
+            "token_usage": int(state.get("token_usage") or 0),
+        }
+
+    @staticmethod
+    def _with_flags(state: dict, columns: dict) -> dict:
+        """Return *state* with its flags normalized to the stored column values."""
+        return dict(state, **{key: columns[key] for key in FLAG_KEYS})
+
+    @staticmethod
+    def _join_state(entry: AgentStateEntry, flags=None) -> dict:
+        """Rebuild a state dict from an entry, taking flags from *flags* if given."""
+        flags = flags or entry
+        state = json.loads(entry.state_json)
+        state["agent_is_active"] = flags.agent_is_active
+        state["completed"] = flags.completed
+        state["token_usage"] = flags.token_usage
+        return state
+
+    def _append(self, session: Session, project: str, state: dict) -> int:
+        """Append *state* as the new latest entry and return its sequence number.
+
+        The header is bumped first so the write lock is taken before the
+        sequence number is read, which keeps concurrent appends ordered.
+        """
+        bumped = session.query(AgentStateHeader).filter(AgentStateHeader.project == project).update(
+            {AgentStateHeader.latest_seq: AgentStateHeader.latest_seq + 1},
+            synchronize_session=False
+        )
+        if bumped:
+            header = session.get(AgentStateHeader, project, populate_existing=True)
+            # Freeze the live flags of the previous latest entry into its row
+            session.query(AgentStateEntry).filter(
+                AgentStateEntry.project == project,
+                AgentStateEntry.seq == header.latest_seq - 1
+            ).update({
+                AgentStateEntry.agent_is_active: header.agent_is_active,
+                AgentStateEntry.completed: header.completed,
+                AgentStateEntry.token_usage: header.token_usage,
+            }, synchronize_session=False)
+        else:
+            header = AgentStateHeader(project=project, latest_seq=1)
+            session.add(header)
+
+        columns = self._split_state(state)
+        session.add(AgentStateEntry(project=project, seq=header.latest_seq, **columns))
+        header.agent_is_active = columns["agent_is_active"]
+        header.completed = columns["completed"]
+        header.token_usage = columns["token_usage"]
+        self._cache_after_commit(session, project, self._with_flags(state, columns))
+        return header.latest_seq
+
+    def _load_stack(self, session: Session, project: str, since: int = 0):
+        header = session.get(AgentStateHeader, project)
+        if header is None:
+            return None
+        entries = session.query(AgentStateEntry).filter(
+            AgentStateEntry.project == project,
+            AgentStateEntry.seq >= since
+        ).order_by(AgentStateEntry.seq).all()
+        return [
+            self._join_state(entry, header if entry.seq == header.latest_seq else None)
+            for entry in entries
+        ]
+
+    def _load_latest(self, session: Session, project: str):
+        header = session.get(AgentStateHeader, project)
+        if header is None:
+            return None, None
+        return header, session.get(AgentStateEntry, (project, header.latest_seq))
+
+    def _delete(self, session: Session, project: str):
+        session.query(AgentStateEntry).filter(AgentStateEntry.project == project).delete()
+        session.query(AgentStateHeader).filter(AgentStateHeader.project == project).delete()
+        self._cache_after_commit(session, project, None)
+
+    def _read_latest(self, project: str):
+        """Read the latest state from the database and cache it."""
+        generation = self._cache.generation(project)
+        with self.session_factory() as session:
+            header, entry = self._load_latest(session, project)
+            state = self._join_state(entry, header) if header else None
+        self._cache.fill(project, generation, state)
+        return state
+
+    def _latest_field(self, project: str, key: str, default=None):
+        hit, value = self._cache.get_field(project, key)
+        if not hit:
+            state = self._read_latest(project)
+            value = state[key] if state else None
+        return default if value is None else value
+
+    def _cache_after_commit(self, session: Session, project: str, state: Optional[dict] = None, **fields):
+        """Cache *state* (or just *fields* of the cached state) once *session* has committed.
+
+        A failed group commit re-runs each operation of the batch on its
+        own, so the cache is never changed from inside an operation: a
+        rolled back attempt must leave no trace. The hook runs on the writer
+        thread right after the commit, in commit order.
+        """
+        if fields:
+            change = lambda _session: self._cache.update(project, **fields)
+        else:
+            change = lambda _session: self._cache.put(project, state)
+        event.listen(session, "after_commit", change, once=True)
+
+    def _write(self, project: str, operation):
+        """Run a write operation, dropping the cached state of *project* if it fails."""
+        try:
+            return run_write(operation)
+        except Exception:
+            self._cache.invalidate(project)
+            raise
+
+    @staticmethod
+    def _emit_delta(project: str, op: str, seq: int, entry: dict):
+        """Broadcast a single changed entry instead of the whole stack.
+
+        *op* is "append" for a new latest entry or "replace" for an update of
+        the latest one. Clients that notice a gap in *seq* ask for a snapshot
+        through the ``agent-state-resync`` socket event.
+        """
+        emit_agent("agent-state-delta", {
+            "project": project,
+            "seq": seq,
+            "op": op,
+            "entry": entry
+        })
+
+    def _replace_latest(self, session: Session, project: str):
+        """Return (seq, state) of the latest entry and refresh its cached copy."""
+        header, entry = self._load_latest(session, project)
+        state = self._join_state(entry, header)
+        self._cache_after_commit(session, project, state)
+        return header.latest_seq, state
+
+    def _migrate_legacy_states(self):
+        """Move stacks stored in the old ``agent_state`` JSON blob into entry rows."""
+        with self.session_factory() as session:
+            legacy_rows = session.query(AgentStateModel).order_by(AgentStateModel.id).all()
+            if not legacy_rows:
+                return
+            for row in legacy_rows:
+                # Only the first row per project was ever read, later duplicates are dropped
+                if session.get(AgentStateHeader, row.project) is None:
+                    for state in json.loads(row.state_stack_json):
+                        self._append(session, row.project, state)
+                    session.flush()
+                session.delete(row)
             session.commit()
-            emit_agent("agent-state", [new_state])
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def create_state(self, project: str):
+        new_state = self.new_state()
+        new_state["step"] = 1
+        new_state["internal_monologue"] = "I'm starting the work..."
+
+        def operation(session: Session):
+            self._delete(session, project)
+            return self._append(session, project, new_state)
+
+        seq = self._write(project, operation)
+        # A new stack invalidates whatever clients hold, so send a snapshot
+        emit_agent("agent-state-snapshot", {"project": project, "seq": seq, "since": seq, "state": [new_state]})
 
     def delete_state(self, project: str):
-        with Session(self.engine) as session:
-            agent_state = session.query(AgentStateModel).filter(AgentStateModel.project == project).all()
-            if agent_state:
-                for state in agent_state:
-                    session.delete(state)
-                session.commit()
+        def operation(session: Session):
+            self._delete(session, project)
+            session.query(TokenUsageCounter).filter(TokenUsageCounter.project == project).delete()
+            session.query(AgentStateModel).filter(AgentStateModel.project == project).delete()
+
+        self._write(project, operation)
 
     def add_to_current_state(self, project: str, state: dict):
-        with Session(self.engine) as session:
-            agent_state = session.query(AgentStateModel).filter(AgentStateModel.project == project).first()
-            if agent_state:
-                state_stack = json.loads(agent_state.state_stack_json)
-                state_stack.append(state)
-                agent_state.state_stack_json = json.dumps(state_stack)
-                session.commit()
-            else:
-                state_stack = [state]
-                agent_state = AgentStateModel(project=project, state_stack_json=json.dumps(state_stack))
-                session.add(agent_state)
-                session.commit()
-            emit_agent("agent-state", state_stack)
+        seq = self._write(project, lambda session: self._append(session, project, state))
+        self._emit_delta(project, "append", seq, state)
+
+    @classmethod
+    def cache_stats(cls) -> dict:
+        """Hit/miss counters of the latest-state cache."""
+        return cls._cache.stats()
 
     def get_current_state(self, project: str):
-        with Session(self.engine) as session:
-            agent_state = session.query(AgentStateModel).filter(AgentStateModel.project == project).first()
-            if agent_state:
-                return json.loads(agent_state.state_stack_json)
-            return None
+        with self.session_factory() as session:
+            return self._load_stack(session, project)
+
+    def get_snapshot(self, project: str, since: int = 0) -> dict:
+        """Return the entries of *project* from sequence number *since* onwards.
+
+        Sent to clients that missed deltas; ``seq`` is the latest sequence
+        number, from which they can resume applying deltas.
+        """
+        with self.session_factory() as session:
+            header = session.get(AgentStateHeader, project)
+            return {
+                "project": project,
+                "seq": header.latest_seq if header else 0,
+                "since": since,
+                "state": self._load_stack(session, project, since=since) or []
+            }
 
     def update_latest_state(self, project: str, state: dict):
-        with Session(self.engine) as session:
-            agent_state = session.query(AgentStateModel).filter(AgentStateModel.project == project).first()
-            if agent_state:
-                state_stack = json.loads(agent_state.state_stack_json)
-                state_stack[-1] = state
-                agent_state.state_stack_json = json.dumps(state_stack)
-                session.commit()
-            else:
-                state_stack = [state]
-                agent_state = AgentStateModel(project=project, state_stack_json=json.dumps(state_stack))
-                session.add(agent_state)
-                session.commit()
-            emit_agent("agent-state", state_stack)
+        def operation(session: Session):
+            header, entry = self._load_latest(session, project)
+            if header:
+                columns = self._split_state(state)
+                entry.state_json = columns["state_json"]
+                header.agent_is_active = columns["agent_is_active"]
+                header.completed = columns["completed"]
+                header.token_usage = columns["token_usage"]
+                self._cache_after_commit(session, project, self._with_flags(state, columns))
+                return "replace", header.latest_seq
+            return "append", self._append(session, project, state)
+
+        op, seq = self._write(project, operation)
+        self._emit_delta(project, op, seq, state)
 
     def get_latest_state(self, project: str):
-        with Session(self.engine) as session:
-            agent_state = session.query(AgentStateModel).filter(AgentStateModel.project == project).first()
-            if agent_state:
-                return json.loads(agent_state.state_stack_json)[-1]
-            return None
+        hit, state = self._cache.get(project)
+        if hit:
+            return state
+        return self._read_latest(project)
 
     def set_agent_active(self, project: str, is_active: bool):
-        with Session(self.engine) as session:
-            agent_state = session.query(AgentStateModel).filter(AgentStateModel.project == project).first()
-            if agent_state:
-                state_stack = json.loads(agent_state.state_stack_json)
-                state_stack[-1]["agent_is_active"] = is_active
-                agent_state.state_stack_json = json.dumps(state_stack)
-                session.commit()
-            else:
-                state_stack = [self.new_state()]
-                state_stack[-1]["agent_is_active"] = is_active
-                agent_state = AgentStateModel(project=project, state_stack_json=json.dumps(state_stack))
-                session.add(agent_state)
-                session.commit()
-            emit_agent("agent-state", state_stack)
+        def operation(session: Session):
+            header = session.get(AgentStateHeader, project)
+            if header:
+                header.agent_is_active = is_active
+                return ("replace",) + self._replace_latest(session, project)
+            new_state = self.new_state()
+            new_state["agent_is_active"] = is_active
+            return "append", self._append(session, project, new_state), new_state
+
+        self._emit_delta(project, *self._write(project, operation))
 
     def is_agent_active(self, project: str):
-        with Session(self.engine) as session:
-            agent_state = session.query(AgentStateModel).filter(AgentStateModel.project == project).first()
-            if agent_state:
-                return json.loads(agent_state.state_stack_json)[-1]["agent_is_active"]
-            return None
+        return self._latest_field(project, "agent_is_active", None)
+
+    def get_active_flags(self, projects) -> dict:
+        """Return ``{project: is_active}`` for *projects* in a single query.
+
+        Projects without any state are reported as inactive.
+        """
+        projects = list(projects)
+        if not projects:
+            return {}
+        with self.session_factory() as session:
+            rows = session.query(AgentStateHeader.project, AgentStateHeader.agent_is_active).filter(
+                AgentStateHeader.project.in_(projects)
+            ).all()
+        active = dict(rows)
+        return {project: bool(active.get(project)) for project in projects}
 
     def set_agent_completed(self, project: str, is_completed: bool):
-        with Session(self.engine) as session:
-            agent_state = session.query(AgentStateModel).filter(AgentStateModel.project == project).first()
-            if agent_state:
-                state_stack = json.loads(agent_state.state_stack_json)
-                state_stack[-1]["internal_monologue"] = "Agent has completed the task."
-                state_stack[-1]["completed"] = is_completed
-                agent_state.state_stack_json = json.dumps(state_stack)
-                session.commit()
-            else:
-                state_stack = [self.new_state()]
-                state_stack[-1]["completed"] = is_completed
-                agent_state = AgentStateModel(project=project, state_stack_json=json.dumps(state_stack))
-                session.add(agent_state)
-                session.commit()
-            emit_agent("agent-state", state_stack)
+        def operation(session: Session):
+            header, entry = self._load_latest(session, project)
+            if header:
+                payload = json.loads(entry.state_json)
+                payload["internal_monologue"] = "Agent has completed the task."
+                entry.state_json = json.dumps(payload)
+                header.completed = is_completed
+                return ("replace",) + self._replace_latest(session, project)
+            new_state = self.new_state()
+            new_state["completed"] = is_completed
+            return "append", self._append(session, project, new_state), new_state
+
+        self._emit_delta(project, *self._write(project, operation))
 
     def is_agent_completed(self, project: str):
-        with Session(self.engine) as session:
-            agent_state = session.query(AgentStateModel).filter(AgentStateModel.project == project).first()
-            if agent_state:
-                return json.loads(agent_state.state_stack_json)[-1]["completed"]
-            return None
-            
-    def update_token_usage(self, project: str, token_usage: int):
-        with Session(self.engine) as session:
-            agent_state = session.query(AgentStateModel).filter(AgentStateModel.project == project).first()
-            if agent_state:
-                state_stack = json.loads(agent_state.state_stack_json)
-                state_stack[-1]["token_usage"] += token_usage
-                agent_state.state_stack_json = json.dumps(state_stack)
-                session.commit()
+        return self._latest_field(project, "completed", None)
+
+    def update_token_usage(self, project: str, token_usage: int) -> int:
+        """Add *token_usage* to the latest entry and the project total, returning the new total.
+
+        Both are plain ``col = col + ?`` updates, so concurrent callers on the
+        same project never lose an increment.
+        """
+        def operation(session: Session):
+            latest_total = session.execute(
+                update(AgentStateHeader)
+                .where(AgentStateHeader.project == project)
+                .values(token_usage=AgentStateHeader.token_usage + token_usage)
+                .returning(AgentStateHeader.token_usage)
+            ).scalar_one_or_none()
+            if latest_total is not None:
+                # The committed value rather than an increment, so applying
+                # it can never count the same tokens twice
+                self._cache_after_commit(session, project, token_usage=latest_total)
             else:
-                state_stack = [self.new_state()]
-                state_stack[-1]["token_usage"] = token_usage
-                agent_state = AgentStateModel(project=project, state_stack_json=json.dumps(state_stack))
-                session.add(agent_state)
-                session.commit()
+                new_state = self.new_state()
+                new_state["token_usage"] = token_usage
+                self._append(session, project, new_state)
+
+            upsert = sqlite_insert(TokenUsageCounter).values(project=project, tokens=token_usage)
+            upsert = upsert.on_conflict_do_update(
+                index_elements=[TokenUsageCounter.project],
+                set_={"tokens": TokenUsageCounter.tokens + upsert.excluded.tokens}
+            ).returning(TokenUsageCounter.tokens)
+            return session.execute(upsert).scalar_one()
+
+        return self._write(project, operation)
+
+    def get_total_token_usage(self, project: str) -> int:
+        with self.session_factory() as session:
+            counter = session.get(TokenUsageCounter, project)
+            return counter.tokens if counter else 0
 
     def get_latest_token_usage(self, project: str):
-        with Session(self.engine) as session:
-            agent_state = session.query(AgentStateModel).filter(AgentStateModel.project == project).first()
-            if agent_state:
-                return json.loads(agent_state.state_stack_json)[-1]["token_usage"]
-            return 0
+        return self._latest_field(project, "token_usage", 0)
 
 if __name__ == "__main__":
     # Real, practical example usage of the AgentState
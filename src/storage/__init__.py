@@ -0,0 +1,12 @@
+from .engine import (
+    get_engine,
+    get_session,
+    session_factory,
+    get_writer,
+    run_write,
+    init_db,
+    migrate_once,
+    dispose_engines,
+)
+from .writer import GroupCommitWriter
+from .two_tier_cache import TwoTierCache
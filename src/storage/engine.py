@@ -0,0 +1,204 @@
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import Session, SQLModel, create_engine
+
+from src.config import Config
+from src.storage.writer import GroupCommitWriter
+
+# One engine (and session factory) per database URL for the whole process.
+# Stores are instantiated freely by agents and API handlers, so creating the
+# engine and running `create_all` in every constructor is avoided here.
+_engines: Dict[str, Engine] = {}
+_session_factories: Dict[str, sessionmaker] = {}
+_schema_sizes: Dict[str, int] = {}
+_writers: Dict[str, GroupCommitWriter] = {}
+_migrations_done = set()
+_lock = threading.RLock()
+
+
+def sqlite_url(path: Optional[str] = None) -> str:
+    """Return the SQLAlchemy URL of *path*, defaulting to the configured SQLite DB."""
+    path = path or Config().get_sqlite_db()
+    return f"sqlite:///{path}"
+
+
+def sqlite_settings() -> Dict[str, Any]:
+    """Return the SQLite tuning options from ``storage.sqlite`` in config.yaml.
+
+    ``durability`` is either "normal" (WAL with synchronous=NORMAL and group
+    commits) or "fsync" (synchronous=FULL and one transaction per write),
+    for operators who cannot lose the last writes on power failure.
+    """
+    config = Config()
+    durability = str(config.get("storage.sqlite.durability", "normal")).lower()
+    return {
+        "wal": bool(config.get("storage.sqlite.wal", True)),
+        "durability": durability,
+        "synchronous": "FULL" if durability == "fsync" else "NORMAL",
+        "mmap_size": int(config.get("storage.sqlite.mmap_size", 256 * 1024 * 1024)),
+        "cache_size": int(config.get("storage.sqlite.cache_size", -64 * 1024)),
+        "busy_timeout": int(config.get("storage.sqlite.busy_timeout", 5000)),
+        "group_commit": bool(config.get("storage.sqlite.group_commit", True)) and durability != "fsync",
+        "group_commit_window_ms": float(config.get("storage.sqlite.group_commit_window_ms", 5)),
+        "group_commit_max_batch": int(config.get("storage.sqlite.group_commit_max_batch", 64)),
+    }
+
+
+def _set_sqlite_pragmas(engine: Engine, settings: Dict[str, Any]):
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        if settings["wal"]:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={settings['synchronous']}")
+        cursor.execute(f"PRAGMA mmap_size={settings['mmap_size']}")
+        cursor.execute(f"PRAGMA cache_size={settings['cache_size']}")
+        cursor.execute(f"PRAGMA busy_timeout={settings['busy_timeout']}")
+        cursor.close()
+
+
+def _create_engine(url: str) -> Engine:
+    config = Config()
+    kwargs = {}
+    is_sqlite = url.startswith("sqlite:///")
+    if is_sqlite:
+        # Ensure the directory for the SQLite database exists
+        db_dir = os.path.dirname(url[len("sqlite:///"):])
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+        # Connections are shared between the Flask-SocketIO worker threads
+        # and the agent threads, so they must not be pinned to one thread.
+        kwargs["connect_args"] = {"check_same_thread": False}
+
+    engine = create_engine(
+        url,
+        pool_size=config.get("storage.sqlite.pool_size", 10),
+        max_overflow=config.get("storage.sqlite.max_overflow", 20),
+        pool_timeout=config.get("storage.sqlite.pool_timeout", 30),
+        **kwargs
+    )
+    if is_sqlite:
+        _set_sqlite_pragmas(engine, sqlite_settings())
+    return engine
+
+
+def get_engine(url: Optional[str] = None) -> Engine:
+    """Return the process-wide engine for *url*, creating it and its schema once.
+
+    Tables of models imported after the engine was created are created the
+    next time the engine is requested, so stores never see a missing table.
+    """
+    url = url or sqlite_url()
+    engine = _engines.get(url)
+    if engine is not None and _schema_sizes[url] == len(SQLModel.metadata.tables):
+        return engine
+
+    with _lock:
+        engine = _engines.get(url)
+        if engine is None:
+            engine = _create_engine(url)
+            _engines[url] = engine
+            _session_factories[url] = sessionmaker(bind=engine, class_=Session)
+        if _schema_sizes.get(url) != len(SQLModel.metadata.tables):
+            SQLModel.metadata.create_all(engine)
+            _schema_sizes[url] = len(SQLModel.metadata.tables)
+        return engine
+
+
+def session_factory(url: Optional[str] = None) -> sessionmaker:
+    """Return the shared session factory bound to the engine of *url*."""
+    url = url or sqlite_url()
+    get_engine(url)
+    return _session_factories[url]
+
+
+def get_session(url: Optional[str] = None) -> Session:
+    """Open a new session on the shared engine of *url*."""
+    return session_factory(url)()
+
+
+def get_writer(url: Optional[str] = None) -> Optional[GroupCommitWriter]:
+    """Return the group-commit writer of *url*, or None if writes commit individually."""
+    url = url or sqlite_url()
+    writer = _writers.get(url)
+    if writer is not None:
+        return writer
+
+    settings = sqlite_settings()
+    if not url.startswith("sqlite:///") or not settings["group_commit"]:
+        return None
+    with _lock:
+        writer = _writers.get(url)
+        if writer is None:
+            writer = GroupCommitWriter(
+                session_factory(url),
+                window=settings["group_commit_window_ms"] / 1000,
+                max_batch=settings["group_commit_max_batch"]
+            )
+            _writers[url] = writer
+        return writer
+
+
+def run_write(operation: Callable[[Session], Any], url: Optional[str] = None) -> Any:
+    """Run ``operation(session)`` in a committed write transaction and return its result.
+
+    Writes go through the group-commit writer when it is enabled, otherwise
+    they are committed on their own session right away.
+    """
+    writer = get_writer(url)
+    if writer is not None:
+        return writer.write(operation)
+    with get_session(url) as session:
+        result = operation(session)
+        session.commit()
+        return result
+
+
+def migrate_once(engine: Engine, name: str, migration: Callable[[], None]):
+    """Run *migration* the first time *name* is requested for *engine*.
+
+    Used by the stores for their one-time data migrations, which would
+    otherwise run on every instantiation.
+    """
+    key = (str(engine.url), name)
+    if key in _migrations_done:
+        return
+    with _lock:
+        if key in _migrations_done:
+            return
+        migration()
+        _migrations_done.add(key)
+
+
+def init_db(url: Optional[str] = None) -> Engine:
+    """Create the engine and all tables at startup, including store migrations."""
+    # Importing the stores registers their tables on SQLModel.metadata and
+    # instantiating them runs their one-time migrations.
+    from src.memory.knowledge_base import KnowledgeBase
+    from src.project import ProjectManager
+    from src.state import AgentState
+
+    engine = get_engine(url)
+    AgentState()
+    ProjectManager()
+    KnowledgeBase()
+    return engine
+
+
+def dispose_engines():
+    """Close every pooled connection and forget the registered engines."""
+    with _lock:
+        for writer in _writers.values():
+            writer.close()
+        _writers.clear()
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _session_factories.clear()
+        _schema_sizes.clear()
+        _migrations_done.clear()
@@ -0,0 +1,163 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Type
+
+from prometheus_client import Counter
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import SQLModel
+
+from .engine import run_write, session_factory
+
+# Persisted entries are pruned (expired rows, then the oldest beyond
+# `max_rows`) once every this many writes rather than on every write.
+PRUNE_EVERY = 100
+
+
+class TwoTierCache:
+    """Cache with an in-memory LRU in front of an optional SQLite table.
+
+    The memory tier is bounded by entry count and, with *max_bytes*, by the
+    size of the serialized values. The SQLite tier survives restarts; a hit
+    there is promoted back into memory. Entries of both tiers expire after
+    *ttl* seconds of *clock*. *url* selects the database, the configured
+    one by default. Only a `threading.Lock` is held, and never across an
+    await, so it can be used from any thread and any event loop.
+
+    Subclasses set the *table* (with ``key``, ``created_at`` and
+    ``expires_at`` columns), the *value_column* the serialized value is
+    stored in, the hit (by ``tier``) and miss counters, and override
+    `dumps` and `loads` for values that are not strings.
+    """
+
+    table: Type[SQLModel]
+    value_column: str
+    hits_total: Counter
+    misses_total: Counter
+
+    def __init__(self, max_items: int = 1000, max_bytes: Optional[int] = None, ttl: float = 3600,
+                 persistent: bool = True, max_rows: int = 10000, url: Optional[str] = None,
+                 clock: Callable[[], float] = time.time):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.persistent = persistent
+        self.max_rows = max_rows
+        self.url = url
+        self.clock = clock
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._puts = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def dumps(value: Any) -> str:
+        return value
+
+    @staticmethod
+    def loads(data: str) -> Any:
+        return data
+
+    def lookup(self, key: str) -> Optional[Any]:
+        """Return the cached value of *key*, or None."""
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, _, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.hits_total.labels(tier="memory").inc()
+                    return value
+                self._remove(key)
+
+        data = self._load(key, now) if self.persistent else None
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                self.misses_total.inc()
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self.hits_total.labels(tier="disk").inc()
+        value = self.loads(data)
+        self._remember(key, value, data, now + self.ttl)
+        return value
+
+    def store(self, key: str, value: Any, **columns):
+        """Cache *value* under *key*; *columns* fill the other columns of its row."""
+        now = self.clock()
+        data = self.dumps(value)
+        self._remember(key, value, data, now + self.ttl)
+        if self.persistent:
+            self._persist(key, data, columns, now)
+
+    def clear(self):
+        """Drop every entry from both tiers."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.persistent:
+            run_write(lambda session: session.execute(delete(self.table)), self.url)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def _remember(self, key: str, value: Any, data: str, expires_at: float):
+        size = len(data.encode("utf-8"))
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            while len(self._entries) > self.max_items or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _load(self, key: str, now: float) -> Optional[str]:
+        with session_factory(self.url)() as session:
+            return session.execute(
+                select(getattr(self.table, self.value_column))
+                .where(self.table.key == key, self.table.expires_at > now)
+            ).scalar_one_or_none()
+
+    def _persist(self, key: str, data: str, columns: Dict[str, Any], now: float):
+        values = {**columns, "key": key, self.value_column: data, "created_at": now, "expires_at": now + self.ttl}
+        statement = sqlite_insert(self.table).values(**values)
+        statement = statement.on_conflict_do_update(index_elements=["key"], set_=values)
+        with self._lock:
+            self._puts += 1
+            prune = self._puts % PRUNE_EVERY == 0
+
+        def op(session):
+            session.execute(statement)
+            if prune:
+                self._prune(session, now)
+
+        run_write(op, self.url)
+
+    def _prune(self, session, now: float):
+        session.execute(delete(self.table).where(self.table.expires_at <= now))
+        excess = session.execute(select(func.count()).select_from(self.table)).scalar_one() - self.max_rows
+        if excess > 0:
+            oldest = select(self.table.key).order_by(self.table.created_at).limit(excess)
+            session.execute(delete(self.table).where(self.table.key.in_(oldest)))
@@ -0,0 +1,112 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable
+
+from sqlalchemy.orm import Session, sessionmaker
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """Background thread that commits writes issued close together in one transaction.
+
+    Agent threads and API handlers submit small write operations (a callable
+    taking a session). The writer waits up to *window* seconds for more
+    operations to arrive, runs them all on one session and commits once, so
+    a burst of state/message updates costs a single transaction and fsync.
+    Callers block until their operation is committed, so reads issued
+    afterwards always see it.
+    """
+
+    def __init__(self, session_factory: sessionmaker, window: float = 0.005, max_batch: int = 64):
+        self.session_factory = session_factory
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.operations = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="sqlite-group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, operation: Callable[[Session], Any]) -> Future:
+        """Queue *operation* and return a future resolved once it is committed."""
+        future = Future()
+        self._queue.put((operation, future))
+        return future
+
+    def write(self, operation: Callable[[Session], Any]) -> Any:
+        """Run *operation* in the next group commit and return its result."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("GroupCommitWriter.write() called from the writer thread")
+        return self.submit(operation).result()
+
+    def close(self):
+        """Commit everything already queued and stop the writer thread."""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._commit(batch)
+
+    def _commit(self, batch):
+        try:
+            with self.session_factory() as session:
+                results = []
+                for operation, _ in batch:
+                    # Each operation sees the effects of the previous ones, and
+                    # none of them relies on objects cached by another.
+                    session.flush()
+                    session.expire_all()
+                    results.append(operation(session))
+                session.commit()
+        except Exception as e:
+            if len(batch) > 1:
+                logger.warning(f"Group commit of {len(batch)} writes failed, retrying one by one: {e}")
+            # Fall back to one transaction per operation so a single bad
+            # write does not fail the other callers of the batch.
+            for operation, future in batch:
+                self._commit_one(operation, future)
+            return
+
+        self.batches += 1
+        self.operations += len(batch)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _commit_one(self, operation, future: Future):
+        try:
+            with self.session_factory() as session:
+                result = operation(session)
+                session.commit()
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            self.batches += 1
+            self.operations += 1
+            future.set_result(result)
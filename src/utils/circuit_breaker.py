@@ -0,0 +1,142 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+from prometheus_client import Counter, Gauge
+
+from src.config import Config
+from src.socket_instance import emit_agent
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_STATE = Gauge('circuit_breaker_state', 'Circuit breaker state per backend (0 closed, 1 half-open, 2 open)', ['backend'])
+CIRCUIT_TRANSITIONS = Counter('circuit_breaker_transitions_total', 'Circuit breaker state changes', ['backend', 'state'])
+CIRCUIT_REJECTED = Counter('circuit_breaker_rejected_total', 'Calls failed fast by an open circuit breaker', ['backend'])
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit is open."""
+
+    def __init__(self, backend: str, retry_after: float):
+        super().__init__(f"{backend} is unavailable, not retrying for {retry_after:.0f}s")
+        self.backend = backend
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Closed/open/half-open circuit breaker guarding one backend.
+
+    After *failure_threshold* consecutive failures the circuit opens and
+    calls fail fast with `CircuitOpenError`. Once *reset_timeout* seconds
+    have passed, a single probe call is let through (half-open): its
+    success closes the circuit, its failure opens it again.
+
+    One breaker per backend is shared process-wide, see `get`.
+    """
+    _breakers: Dict[str, "CircuitBreaker"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, backend: str, failure_threshold: int = 5, reset_timeout: float = 60,
+                 enabled: bool = True, clock: Callable[[], float] = time.monotonic):
+        self.backend = backend
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.enabled = enabled
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.labels(backend=backend).set(_STATE_VALUES[CLOSED])
+
+    @classmethod
+    def get(cls, backend: str) -> "CircuitBreaker":
+        """Return the shared breaker of *backend*, configured from ``error_handling.circuit_breaker``."""
+        breaker = cls._breakers.get(backend)
+        if breaker is not None:
+            return breaker
+        with cls._registry_lock:
+            breaker = cls._breakers.get(backend)
+            if breaker is None:
+                config = Config()
+                breaker = cls(
+                    backend,
+                    failure_threshold=int(config.get("error_handling.circuit_breaker.failure_threshold", 5)),
+                    reset_timeout=float(config.get("error_handling.circuit_breaker.reset_timeout", 60)),
+                    enabled=bool(config.get("error_handling.circuit_breaker.enabled", True)),
+                )
+                cls._breakers[backend] = breaker
+            return breaker
+
+    def before_call(self):
+        """Raise `CircuitOpenError` unless a call to the backend may go ahead."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            now = self.clock()
+            if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            CIRCUIT_REJECTED.labels(backend=self.backend).inc()
+            raise CircuitOpenError(self.backend, max(0.0, self.opened_at + self.reset_timeout - now))
+
+    def record_success(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            if self.state != CLOSED:
+                self._transition(CLOSED)
+
+    def record_failure(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.opened_at = self.clock()
+                self._transition(OPEN)
+
+    @contextmanager
+    def guard(self):
+        """Wrap one call to the backend: fail fast while open, record its outcome otherwise."""
+        self.before_call()
+        try:
+            yield
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            # Cancelled, not failed: let another caller probe instead
+            with self._lock:
+                self._probing = False
+            raise
+        else:
+            self.record_success()
+
+    def _transition(self, state: str):
+        previous, self.state = self.state, state
+        CIRCUIT_STATE.labels(backend=self.backend).set(_STATE_VALUES[state])
+        CIRCUIT_TRANSITIONS.labels(backend=self.backend, state=state).inc()
+        logger.warning(f"Circuit breaker for {self.backend}: {previous} -> {state}")
+        emit_agent("circuit-breaker", {
+            "backend": self.backend,
+            "state": state,
+            "previous": previous,
+            "retry_after": self.reset_timeout if state == OPEN else 0,
+        })
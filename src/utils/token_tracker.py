@@ -1,22 +1,59 @@
 import tiktoken
 from typing import Dict, Optional
+import hashlib
 import json
 import logging
+import threading
+from collections import OrderedDict, deque
 from datetime import datetime
 from src.config import Config
+from src.utils.usage_ledger import UsageLedger
 
 logger = logging.getLogger(__name__)
 
+# Token counts of recently seen texts, so a prompt that is sent again
+# (retries, the same code context for several agents) is not re-encoded
+COUNT_CACHE_SIZE = 256
+
 class TokenTracker:
-    def __init__(self):
+    """Counts tokens and cost of LLM and search calls.
+
+    Every call is appended to the SQLite usage ledger (see `UsageLedger`).
+    In memory only rollups are kept, each bounded: per model, per project
+    (the most recently active ``monitoring.usage_rollups.projects``), per
+    hour (the last ``monitoring.usage_rollups.hours``) and the most recent
+    ``monitoring.usage_rollups.recent_calls`` calls.
+    """
+
+    def __init__(self, ledger: Optional[UsageLedger] = None):
         self.config = Config()
-        self.usage = {
+        self.max_projects = int(self.config.get("monitoring.usage_rollups.projects", 500))
+        self.max_hours = int(self.config.get("monitoring.usage_rollups.hours", 48))
+        self.recent_calls = int(self.config.get("monitoring.usage_rollups.recent_calls", 100))
+        self.persist = bool(self.config.get("monitoring.usage_ledger.enabled", True))
+        self._ledger = ledger
+        self.usage = self._empty_usage()
+        self.encoders = {}
+        self._counts = OrderedDict()
+        self._counts_lock = threading.Lock()
+        self._usage_lock = threading.Lock()
+
+    def _empty_usage(self) -> Dict:
+        return {
             "total_tokens": 0,
             "total_cost": 0.0,
-            "calls": [],
-            "model_usage": {}
+            "calls": deque(maxlen=self.recent_calls),
+            "model_usage": {},
+            "project_usage": OrderedDict(),
+            "hourly_usage": OrderedDict()
         }
-        self.encoders = {}
+
+    @property
+    def ledger(self) -> Optional[UsageLedger]:
+        # The shared ledger starts a writer thread, so only once it is needed
+        if self._ledger is None and self.persist:
+            self._ledger = UsageLedger.shared()
+        return self._ledger
 
     def _get_encoder(self, model: str) -> tiktoken.Encoding:
         """Get or create encoder for a model."""
@@ -37,12 +74,28 @@ class TokenTracker:
 
     def count_tokens(self, text: str, model: str) -> int:
         """Count tokens in text for a specific model."""
+        key = (model, hashlib.sha1(text.encode("utf-8")).hexdigest())
+        with self._counts_lock:
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+                return count
         try:
             encoder = self._get_encoder(model)
-            return len(encoder.encode(text))
+            count = len(encoder.encode(text))
         except Exception as e:
             logger.error(f"Error counting tokens: {str(e)}")
             return 0
+        with self._counts_lock:
+            self._counts[key] = count
+            if len(self._counts) > COUNT_CACHE_SIZE:
+                self._counts.popitem(last=False)
+        return count
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Rough token count of *text* (about 4 characters per token) without encoding it."""
+        return len(text) // 4 + 1
 
     def calculate_cost(self, input_tokens: int, output_tokens: int, model: str) -> float:
         """Calculate cost for input and output tokens."""
@@ -62,42 +115,53 @@ class TokenTracker:
                    model: str, 
                    input_text: str, 
                    output_text: str, 
-                   metadata: Optional[Dict] = None) -> Dict:
-        """Track token usage and cost for an API call."""
+                   metadata: Optional[Dict] = None,
+                   usage: Optional[Dict] = None) -> Dict:
+        """Track token usage and cost for an API call.
+
+        *usage* is the ``prompt_tokens``/``completion_tokens`` block reported
+        by the provider; the texts are only tokenized when it is missing.
+        """
         try:
-            input_tokens = self.count_tokens(input_text, model)
-            output_tokens = self.count_tokens(output_text, model)
+            if usage and usage.get("prompt_tokens") is not None and usage.get("completion_tokens") is not None:
+                input_tokens = usage["prompt_tokens"]
+                output_tokens = usage["completion_tokens"]
+            else:
+                input_tokens = self.count_tokens(input_text, model)
+                output_tokens = self.count_tokens(output_text, model)
             total_tokens = input_tokens + output_tokens
             
             cost = self.calculate_cost(input_tokens, output_tokens, model)
             
+            now = datetime.utcnow()
             call_data = {
-                "timestamp": datetime.utcnow().isoformat(),
+                "timestamp": now.isoformat(),
                 "model": model,
                 "input_tokens": input_tokens,
                 "output_tokens": output_tokens,
                 "total_tokens": total_tokens,
                 "cost": cost,
+                "reported": bool(usage),
                 "metadata": metadata or {}
             }
             
-            # Update usage statistics
-            self.usage["total_tokens"] += total_tokens
-            self.usage["total_cost"] += cost
-            self.usage["calls"].append(call_data)
-            
-            # Update model-specific usage
-            if model not in self.usage["model_usage"]:
-                self.usage["model_usage"][model] = {
-                    "total_tokens": 0,
-                    "total_cost": 0.0,
-                    "calls": 0
-                }
-            
-            self.usage["model_usage"][model]["total_tokens"] += total_tokens
-            self.usage["model_usage"][model]["total_cost"] += cost
-            self.usage["model_usage"][model]["calls"] += 1
-            
+            metadata = metadata or {}
+            project = metadata.get("project_name")
+            with self._usage_lock:
+                self.usage["total_tokens"] += total_tokens
+                self.usage["total_cost"] += cost
+                self.usage["calls"].append(call_data)
+                self._rollup(self.usage["model_usage"], model, input_tokens, output_tokens, cost)
+                if project:
+                    self._rollup(self.usage["project_usage"], project, input_tokens, output_tokens, cost,
+                                 limit=self.max_projects)
+                self._rollup(self.usage["hourly_usage"], now.strftime("%Y-%m-%dT%H:00"), input_tokens, output_tokens, cost,
+                             limit=self.max_hours)
+
+            if self.ledger is not None:
+                self.ledger.record(model, project, metadata.get("type", "llm"), input_tokens, output_tokens,
+                                   cost, reported=bool(usage))
+
             logger.info(f"Token usage tracked: {json.dumps(call_data)}")
             return call_data
             
@@ -105,14 +169,32 @@ class TokenTracker:
             logger.error(f"Error tracking usage: {str(e)}")
             return {}
 
+    @staticmethod
+    def _rollup(table: Dict, key: str, input_tokens: int, output_tokens: int, cost: float, limit: Optional[int] = None):
+        entry = table.get(key)
+        if entry is None:
+            entry = table[key] = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0, "total_cost": 0.0, "calls": 0}
+        entry["input_tokens"] += input_tokens
+        entry["output_tokens"] += output_tokens
+        entry["total_tokens"] += input_tokens + output_tokens
+        entry["total_cost"] += cost
+        entry["calls"] += 1
+        if limit is not None:
+            table.move_to_end(key)
+            while len(table) > limit:
+                table.popitem(last=False)
+
     def get_usage_summary(self) -> Dict:
         """Get summary of token usage and costs."""
-        return {
-            "total_tokens": self.usage["total_tokens"],
-            "total_cost": self.usage["total_cost"],
-            "model_usage": self.usage["model_usage"],
-            "last_updated": datetime.utcnow().isoformat()
-        }
+        with self._usage_lock:
+            return {
+                "total_tokens": self.usage["total_tokens"],
+                "total_cost": self.usage["total_cost"],
+                "model_usage": {model: dict(entry) for model, entry in self.usage["model_usage"].items()},
+                "project_usage": {project: dict(entry) for project, entry in self.usage["project_usage"].items()},
+                "hourly_usage": {hour: dict(entry) for hour, entry in self.usage["hourly_usage"].items()},
+                "last_updated": datetime.utcnow().isoformat()
+            }
 
     def save_usage_report(self, filepath: str):
         """Save usage report to file."""
@@ -124,11 +206,7 @@ class TokenTracker:
             logger.error(f"Error saving usage report: {str(e)}")
 
     def reset_usage(self):
-        """Reset usage statistics."""
-        self.usage = {
-            "total_tokens": 0,
-            "total_cost": 0.0,
-            "calls": [],
-            "model_usage": {}
-        }
+        """Reset the in-memory statistics; the ledger keeps every recorded call."""
+        with self._usage_lock:
+            self.usage = self._empty_usage()
         logger.info("Usage statistics reset") 
\ No newline at end of file
@@ -0,0 +1,155 @@
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from sqlalchemy import Index, func, insert, select
+from sqlmodel import Field, SQLModel
+
+from src.config import Config
+from src.storage import run_write, session_factory
+
+logger = logging.getLogger(__name__)
+
+
+class UsageRecord(SQLModel, table=True):
+    """One billed LLM or search call. Rows are only ever appended."""
+    __tablename__ = "usage_ledger"
+    __table_args__ = (Index("ix_usage_ledger_project_timestamp", "project", "timestamp"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    timestamp: float = Field(index=True)
+    model: str
+    project: Optional[str] = None
+    kind: str = "llm"
+    input_tokens: int = 0
+    output_tokens: int = 0
+    total_tokens: int = 0
+    cost: float = 0.0
+    reported: bool = False
+
+
+class UsageLedger:
+    """Appends usage records to SQLite in batches from a background thread.
+
+    Records are buffered and written together once *batch_size* of them
+    are pending or *flush_interval* seconds have passed, whichever comes
+    first, and on interpreter exit. `summary` flushes before it queries, so
+    it always includes the calls made so far.
+    """
+    _instance: Optional["UsageLedger"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, batch_size: int = 50, flush_interval: float = 5.0, max_pending: int = 10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.dropped = 0
+        # The oldest records fall off once the database stops keeping up
+        self._pending: Deque[Dict[str, Any]] = deque(maxlen=max_pending)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="usage-ledger", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def shared(cls) -> "UsageLedger":
+        """Return the process-wide ledger configured from ``monitoring.usage_ledger``."""
+        with cls._instance_lock:
+            if cls._instance is None:
+                config = Config()
+                cls._instance = cls(
+                    batch_size=int(config.get("monitoring.usage_ledger.batch_size", 50)),
+                    flush_interval=float(config.get("monitoring.usage_ledger.flush_interval", 5.0)),
+                    max_pending=int(config.get("monitoring.usage_ledger.max_pending", 10000)),
+                )
+            return cls._instance
+
+    def record(self, model: str, project: Optional[str], kind: str, input_tokens: int,
+               output_tokens: int, cost: float, reported: bool = False, timestamp: Optional[float] = None):
+        row = {
+            "timestamp": timestamp or time.time(),
+            "model": model,
+            "project": project,
+            "kind": kind,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "cost": cost,
+            "reported": reported,
+        }
+        with self._lock:
+            if len(self._pending) == self.max_pending:
+                self.dropped += 1
+            self._pending.append(row)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Write every pending record now."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending = list(self._pending), deque(maxlen=self.max_pending)
+            if not rows:
+                return
+            try:
+                run_write(lambda session: session.execute(insert(UsageRecord), rows))
+            except Exception as e:
+                logger.error(f"Failed to write {len(rows)} usage records: {str(e)}")
+                # Keep them for the next flush, within the same bound
+                with self._lock:
+                    pending = deque(rows, maxlen=self.max_pending)
+                    pending.extend(self._pending)
+                    self.dropped += len(rows) + len(self._pending) - len(pending)
+                    self._pending = pending
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self.flush()
+
+    def summary(self, project: Optional[str] = None, since: Optional[float] = None) -> Dict[str, Any]:
+        """Aggregate the recorded usage, optionally of one *project* and from *since* (epoch seconds)."""
+        self.flush()
+        conditions = []
+        if project:
+            conditions.append(UsageRecord.project == project)
+        if since:
+            conditions.append(UsageRecord.timestamp >= since)
+
+        totals = (
+            func.count().label("calls"),
+            func.coalesce(func.sum(UsageRecord.input_tokens), 0).label("input_tokens"),
+            func.coalesce(func.sum(UsageRecord.output_tokens), 0).label("output_tokens"),
+            func.coalesce(func.sum(UsageRecord.total_tokens), 0).label("total_tokens"),
+            func.coalesce(func.sum(UsageRecord.cost), 0.0).label("cost"),
+        )
+        with session_factory()() as session:
+            overall = session.execute(select(*totals).where(*conditions)).one()
+            by_model = session.execute(
+                select(UsageRecord.model, UsageRecord.kind, *totals)
+                .where(*conditions).group_by(UsageRecord.model, UsageRecord.kind)
+            ).all()
+            by_project = session.execute(
+                select(UsageRecord.project, *totals).where(*conditions).group_by(UsageRecord.project)
+            ).all() if not project else []
+
+        return {
+            "project": project,
+            "since": since,
+            **overall._asdict(),
+            "models": [row._asdict() for row in by_model],
+            "projects": [row._asdict() for row in by_project],
+        }
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
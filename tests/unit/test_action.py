@@ -0,0 +1,48 @@
+import asyncio
+import json
+
+import pytest
+
+import src.llm.llm as llm_module
+import src.llm.streaming as streaming
+from src.agents.action.action import Action
+from src.llm import LLM
+from src.llm.semantic_cache import SemanticCache
+
+
+class FakeAzureOpenAI:
+    calls = 0
+
+    async def astream(self, model_id, prompt, temperature=0, usage=None):
+        FakeAzureOpenAI.calls += 1
+        await asyncio.sleep(0)
+        yield json.dumps({"response": f"reply {FakeAzureOpenAI.calls}", "action": "answer"})
+
+
+@pytest.fixture
+def action(monkeypatch):
+    vectors = {
+        'add "tags" to the todo app\nand a filter': [1.0, 0.0],
+        'please add "tags" to the todo app\nand a filter': [0.99, 0.1],
+    }
+    monkeypatch.setattr(llm_module, "AzureOpenAI", FakeAzureOpenAI)
+    monkeypatch.setattr(llm_module, "emit_agent", lambda *args, **kwargs: True)
+    monkeypatch.setattr(streaming, "emit_agent", lambda *args, **kwargs: True)
+    monkeypatch.setattr(LLM, "_semantic_cache", SemanticCache(embed=lambda text: vectors[text]))
+    FakeAzureOpenAI.calls = 0
+    action = Action(base_model="gpt-4o")
+    action.llm.use_cache = False
+    action.llm.use_semantic_cache = True
+    return action
+
+
+def test_semantic_cache_is_keyed_on_the_latest_user_message(action):
+    conversation = ["User: build a todo app", "Agent: Done, it is in main.py",
+                    'User: add "tags" to the todo app\nand a filter', "Agent: On it"]
+    reworded = conversation[:2] + ['User: please add "tags" to the todo app\nand a filter', "Agent: On it"]
+
+    assert Action.latest_user_message(conversation) == 'add "tags" to the todo app\nand a filter'
+    assert action.execute(conversation, None) == ("reply 1", "answer")
+    assert action.execute(reworded, None) == ("reply 1", "answer")
+    assert FakeAzureOpenAI.calls == 1
+    assert LLM._semantic_cache.stats()["hits"] == 1
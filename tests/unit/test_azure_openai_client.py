@@ -0,0 +1,28 @@
+import asyncio
+from src.llm.azure_openai_client import AzureOpenAI
+
+
+def test_client_is_pooled_per_endpoint():
+    assert AzureOpenAI().client is AzureOpenAI().client
+
+
+def test_in_flight_requests_are_capped():
+    client = AzureOpenAI()
+    client.max_in_flight = 2
+    AzureOpenAI._in_flight.clear()
+    running = []
+    peak = []
+
+    async def fake_request(i):
+        async with client._semaphore("deployment"):
+            running.append(i)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(i)
+
+    async def scenario():
+        await asyncio.gather(*(fake_request(i) for i in range(6)))
+
+    asyncio.run(scenario())
+    AzureOpenAI._in_flight.clear()
+    assert max(peak) == 2
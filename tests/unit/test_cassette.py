@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+import pytest
+
+from src.llm.cassette import Cassette, CassetteMissError
+
+
+async def upstream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_recorded_response_is_replayed_from_file(tmp_path):
+    path = str(tmp_path / "cassettes" / "llm.jsonl")
+    recorder = Cassette(path, mode="record")
+    chunks = asyncio.run(collect(recorder.record("gpt-4o", " hello ", upstream("hi ", "there"))))
+    assert chunks == ["hi ", "there"]
+    recorder.put("gpt-4o", "other", "answer")
+
+    with open(path) as f:
+        assert [json.loads(line)["response"] for line in f] == ["hi there", "answer"]
+
+    player = Cassette(path, mode="replay")
+    assert asyncio.run(collect(player.replay("gpt-4o", "hello"))) == ["hi there"]
+    assert player.get("gpt-4o", "other") == "answer"
+    with pytest.raises(CassetteMissError):
+        asyncio.run(collect(player.replay("gpt-4o", "hello", temperature=0.5)))
+
+
+def test_replay_is_paced_by_latency_and_token_rate(tmp_path):
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    player = Cassette(str(tmp_path / "llm.jsonl"), mode="replay", latency=0.5, tokens_per_second=10, chunk_tokens=2,
+                      sleep=fake_sleep)
+    player.put("gpt-4o", "prompt", "one two three four five")
+
+    chunks = asyncio.run(collect(player.replay("gpt-4o", "prompt")))
+    assert "".join(chunks) == "one two three four five"
+    assert len(chunks) == 3
+    assert sleeps == [0.5, 0.2, 0.2, 0.1]
+
+
+def test_unknown_mode_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        Cassette(str(tmp_path / "llm.jsonl"), mode="rewind")
@@ -0,0 +1,76 @@
+import pytest
+import src.utils.circuit_breaker as circuit_breaker
+from src.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    emitted = []
+    monkeypatch.setattr(circuit_breaker, "emit_agent", lambda channel, content, log=True: emitted.append(content))
+    breaker = CircuitBreaker("test-backend", failure_threshold=2, reset_timeout=10, clock=FakeClock())
+    breaker.emitted = emitted
+    return breaker
+
+
+def fail(breaker):
+    with pytest.raises(ValueError):
+        with breaker.guard():
+            raise ValueError("backend down")
+
+
+def test_opens_after_threshold_and_fails_fast(breaker):
+    fail(breaker)
+    assert breaker.state == circuit_breaker.CLOSED
+    fail(breaker)
+    assert breaker.state == circuit_breaker.OPEN
+
+    with pytest.raises(CircuitOpenError) as error:
+        with breaker.guard():
+            pytest.fail("an open circuit must not call the backend")
+    assert error.value.retry_after == 10
+    assert [change["state"] for change in breaker.emitted] == ["open"]
+
+
+def test_half_open_lets_a_single_probe_through(breaker):
+    fail(breaker)
+    fail(breaker)
+    breaker.clock.now = 10
+
+    breaker.before_call()
+    assert breaker.state == circuit_breaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == circuit_breaker.CLOSED
+    assert [change["state"] for change in breaker.emitted] == ["open", "half-open", "closed"]
+
+
+def test_failed_probe_reopens(breaker):
+    fail(breaker)
+    fail(breaker)
+    breaker.clock.now = 10
+    fail(breaker)
+    assert breaker.state == circuit_breaker.OPEN
+    assert breaker.opened_at == 10
+
+
+def test_success_resets_the_failure_count(breaker):
+    fail(breaker)
+    with breaker.guard():
+        pass
+    fail(breaker)
+    assert breaker.state == circuit_breaker.CLOSED
+
+
+def test_shared_per_backend():
+    assert CircuitBreaker.get("azure_openai") is CircuitBreaker.get("azure_openai")
+    assert CircuitBreaker.get("azure_openai") is not CircuitBreaker.get("duckduckgo")
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+import pytest
+from src.llm.event_loop import BackgroundLoop, background_loop, iterate_in_background, run_in_background
+
+
+@pytest.fixture
+def background():
+    background = BackgroundLoop(name="test-loop")
+    yield background
+    background.stop()
+
+
+def test_calls_share_one_loop(background):
+    async def current_loop():
+        return asyncio.get_running_loop()
+
+    first = background.run(current_loop())
+    assert background.run(current_loop()) is first
+    assert first is background.loop
+
+
+def test_concurrent_callers(background):
+    results = []
+
+    async def work(i):
+        await asyncio.sleep(0.01)
+        return i
+
+    threads = [threading.Thread(target=lambda i=i: results.append(background.run(work(i)))) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == list(range(8))
+
+
+def test_exceptions_propagate(background):
+    async def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        background.run(fail())
+
+
+def test_run_from_loop_thread_is_rejected(background):
+    async def nested():
+        return background.run(asyncio.sleep(0))
+
+    with pytest.raises(RuntimeError):
+        background.run(nested())
+
+
+def test_run_in_background_from_another_loop():
+    async def current_loop():
+        return asyncio.get_running_loop()
+
+    async def caller():
+        return await run_in_background(current_loop())
+
+    assert asyncio.run(caller()) is background_loop().loop
+
+
+def test_iterate_in_background_from_another_loop():
+    loops = []
+
+    async def numbers():
+        for i in range(3):
+            loops.append(asyncio.get_running_loop())
+            yield i
+
+    async def caller():
+        return [i async for i in iterate_in_background(numbers())]
+
+    assert asyncio.run(caller()) == [0, 1, 2]
+    assert set(loops) == {background_loop().loop}
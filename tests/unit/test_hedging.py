@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from src.llm.hedging import LLM_HEDGE_WINS, HedgePolicy, with_deadline
+
+
+class FakeStream:
+    """Async iterator yielding *chunks* after *delay* seconds, recording whether it was closed."""
+
+    def __init__(self, delay, chunks=("a", "b")):
+        self.delay = delay
+        self.chunks = list(chunks)
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+            self.delay = 0
+        if not self.chunks:
+            raise StopAsyncIteration
+        return self.chunks.pop(0)
+
+    async def aclose(self):
+        self.closed = True
+
+
+def opener(*streams):
+    opened = []
+    pending = list(streams)
+
+    def open_stream():
+        opened.append(pending.pop(0))
+        return opened[-1]
+    return open_stream, opened
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def policy_with_p95(seconds, **kwargs):
+    policy = HedgePolicy(min_samples=5, **kwargs)
+    for _ in range(5):
+        policy.observe("coder", 100, seconds)
+    return policy
+
+
+def test_deadline_cancels_a_hung_stream():
+    stream = FakeStream(delay=10)
+    with pytest.raises(TimeoutError):
+        asyncio.run(collect(with_deadline(stream, 0.05)))
+    assert stream.closed
+
+
+def test_first_token_deadline_lets_a_started_stream_finish():
+    class SlowChunks(FakeStream):
+        async def __anext__(self):
+            await asyncio.sleep(0.03)
+            return await super().__anext__()
+
+    stream = SlowChunks(delay=0, chunks=["a", "b", "c", "d"])
+    assert asyncio.run(collect(with_deadline(stream, 0.05, first_token_only=True))) == ["a", "b", "c", "d"]
+    with pytest.raises(TimeoutError):
+        asyncio.run(collect(with_deadline(FakeStream(delay=10), 0.05, first_token_only=True)))
+
+
+def test_no_hedge_until_enough_samples():
+    policy = HedgePolicy(min_samples=5)
+    for _ in range(4):
+        policy.observe("coder", 100, 0.2)
+    assert policy.delay("coder", 100) is None
+    policy.observe("coder", 100, 0.2)
+    assert policy.delay("coder", 100) == 0.2
+    # Other prompt sizes keep their own latencies
+    assert policy.delay("coder", 5000) is None
+
+
+def test_slow_primary_is_hedged_and_the_faster_stream_wins():
+    policy = policy_with_p95(0.02)
+    open_stream, opened = opener(FakeStream(delay=10, chunks=["slow"]), FakeStream(delay=0, chunks=["fast", "!"]))
+    before = LLM_HEDGE_WINS.labels(agent="coder", winner="hedge")._value.get()
+
+    async def run():
+        chunks = []
+        async for chunk in policy.stream("coder", 100, open_stream):
+            # The losing primary is cancelled before the first chunk is used
+            assert opened[0].closed
+            chunks.append(chunk)
+        return chunks
+
+    assert asyncio.run(run()) == ["fast", "!"]
+    assert len(opened) == 2
+    assert all(stream.closed for stream in opened)
+    assert LLM_HEDGE_WINS.labels(agent="coder", winner="hedge")._value.get() == before + 1
+    # The primary is sampled at the time the hedge answered in
+    assert len(policy._samples[("coder", policy.bucket(100))]) == 6
+
+
+def test_fast_primary_and_vetoed_hedges_send_one_request():
+    policy = policy_with_p95(0.5)
+    open_stream, opened = opener(FakeStream(delay=0), FakeStream(delay=0))
+    assert asyncio.run(collect(policy.stream("coder", 100, open_stream))) == ["a", "b"]
+    assert len(opened) == 1
+
+    policy = policy_with_p95(0.01)
+    open_stream, opened = opener(FakeStream(delay=0.05), FakeStream(delay=0))
+    assert asyncio.run(collect(policy.stream("coder", 100, open_stream, admit=lambda: False))) == ["a", "b"]
+    assert len(opened) == 1
@@ -0,0 +1,200 @@
+import asyncio
+import threading
+import pytest
+import src.llm.llm as llm_module
+import src.llm.streaming as streaming
+from src.llm import LLM
+from src.llm.cassette import Cassette, CassetteMissError
+from src.llm.hedging import HedgePolicy
+from src.llm.rate_limiter import RateLimiter
+from src.llm.semantic_cache import SemanticCache
+from src.utils.circuit_breaker import CircuitBreaker
+from src.utils.token_tracker import TokenTracker
+
+
+class FakeAzureOpenAI:
+    calls = 0
+
+    async def astream(self, model_id, prompt, temperature=0, usage=None):
+        FakeAzureOpenAI.calls += 1
+        await asyncio.sleep(0.1)
+        for word in ["echo: ", prompt]:
+            yield word
+        if usage is not None:
+            usage.update(prompt_tokens=7, completion_tokens=3, total_tokens=10)
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    monkeypatch.setattr(llm_module, "AzureOpenAI", FakeAzureOpenAI)
+    monkeypatch.setattr(llm_module, "emit_agent", lambda *args, **kwargs: True)
+    monkeypatch.setattr(streaming, "emit_agent", lambda *args, **kwargs: True)
+    FakeAzureOpenAI.calls = 0
+    llm = LLM(model_id="gpt-4o", agent="test")
+    llm.use_cache = False
+    return llm
+
+
+def test_inference_joins_the_stream(llm):
+    assert llm.inference("hello", None) == "echo: hello"
+
+    async def consume():
+        return [chunk async for chunk in llm.astream("hello", None)]
+
+    assert asyncio.run(consume()) == ["echo: ", "hello"]
+
+
+def test_identical_concurrent_calls_are_coalesced(llm):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(llm.inference("same prompt", None))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["echo: same prompt"] * 5
+    assert FakeAzureOpenAI.calls == 1
+    assert LLM._in_flight == {}
+
+
+def test_calls_of_different_projects_are_not_coalesced(llm):
+    results = []
+    threads = [threading.Thread(target=lambda project=project: results.append(llm.inference("same prompt", project)))
+               for project in ("first", "second", "second")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["echo: same prompt"] * 3
+    assert FakeAzureOpenAI.calls == 2
+
+
+def test_inference_many_keeps_order_and_reports_failures(llm, monkeypatch):
+    class FlakyAzureOpenAI(FakeAzureOpenAI):
+        async def astream(self, model_id, prompt, temperature=0, usage=None):
+            if prompt == "bad":
+                raise ValueError("upstream error")
+            async for chunk in super().astream(model_id, prompt, temperature, usage):
+                yield chunk
+
+    monkeypatch.setattr(llm_module, "AzureOpenAI", FlakyAzureOpenAI)
+    llm.coalesce = False
+    monkeypatch.setitem(llm._config.config["error_handling"], "max_retries", 1)
+    monkeypatch.setitem(llm._config.config["error_handling"], "retry_delay", 0)
+
+    results = llm.inference_many(["one", "bad", "three"], None, max_concurrency=2)
+    assert results[0] == "echo: one"
+    assert isinstance(results[1], Exception)
+    assert results[2] == "echo: three"
+
+
+def test_semantic_cache_reuses_answers_to_similar_keys(llm, monkeypatch):
+    vectors = {"run the tests": [1.0, 0.0], "please run the tests": [0.99, 0.1], "deploy": [0.0, 1.0]}
+    monkeypatch.setattr(LLM, "_semantic_cache", SemanticCache(embed=lambda text: vectors[text]))
+    llm.use_semantic_cache = True
+
+    first = llm.inference("Task: run the tests", None, semantic_key="run the tests")
+    assert llm.inference("Task: please run the tests", None, semantic_key="please run the tests") == first
+    assert llm.inference("Task: deploy", None, semantic_key="deploy") == "echo: Task: deploy"
+    assert FakeAzureOpenAI.calls == 2
+
+
+def test_replay_mode_serves_recorded_responses_offline(llm, monkeypatch, tmp_path):
+    cassette = Cassette(str(tmp_path / "llm.jsonl"), mode="replay")
+    cassette.put("gpt-4o", "hello", "recorded answer")
+    monkeypatch.setattr(LLM, "_cassette", cassette)
+
+    assert llm.model_enum("GPT-4o") == ("REPLAY", "gpt-4o")
+    assert llm.inference("hello", None) == "recorded answer"
+    with pytest.raises(CassetteMissError):
+        llm.inference("never recorded", None)
+    assert FakeAzureOpenAI.calls == 0
+
+
+def test_attempts_past_their_deadline_are_cancelled_and_retried(llm, monkeypatch):
+    monkeypatch.setattr(CircuitBreaker, "_breakers", {})
+    monkeypatch.setitem(llm._config.config["error_handling"], "max_retries", 2)
+    monkeypatch.setitem(llm._config.config["error_handling"], "retry_delay", 0)
+    llm.deadline = 0.05
+
+    with pytest.raises(RuntimeError):
+        llm.inference("too slow", None)
+    assert FakeAzureOpenAI.calls == 2
+
+    llm.deadline = 1
+    assert llm.inference("in time", None) == "echo: in time"
+
+
+def test_default_deadline_only_applies_to_the_first_token(llm, monkeypatch):
+    class SlowChunksAzureOpenAI(FakeAzureOpenAI):
+        async def astream(self, model_id, prompt, temperature=0, usage=None):
+            async for chunk in super().astream(model_id, prompt, temperature, usage):
+                yield chunk
+                await asyncio.sleep(0.2)
+
+    monkeypatch.setattr(llm_module, "AzureOpenAI", SlowChunksAzureOpenAI)
+    assert llm.deadline_first_token_only
+    llm.deadline = 0.15
+    assert llm.inference("long answer", None) == "echo: long answer"
+    assert FakeAzureOpenAI.calls == 1
+
+    assert not LLM(model_id="gpt-4o", agent="coder").deadline_first_token_only
+
+
+def test_reported_usage_is_tracked_without_tokenizing(llm, monkeypatch):
+    tracker = TokenTracker()
+    monkeypatch.setattr(LLM, "_token_tracker", tracker)
+    monkeypatch.setattr(tracker, "count_tokens", lambda *args: pytest.fail("prompt was tokenized"))
+
+    llm.inference("count me", None)
+    call = tracker.usage["calls"][-1]
+    assert (call["input_tokens"], call["output_tokens"], call["reported"]) == (7, 3, True)
+
+
+def test_hedged_calls_track_the_usage_of_each_request(llm, monkeypatch):
+    class SlowFirstAzureOpenAI(FakeAzureOpenAI):
+        async def astream(self, model_id, prompt, temperature=0, usage=None):
+            if FakeAzureOpenAI.calls == 0:
+                await asyncio.sleep(10)
+            async for chunk in super().astream(model_id, prompt, temperature, usage):
+                yield chunk
+
+    tracker = TokenTracker()
+    hedging = HedgePolicy(min_samples=1)
+    hedging.observe("test", 0, 0.01)
+    monkeypatch.setattr(llm_module, "AzureOpenAI", SlowFirstAzureOpenAI)
+    monkeypatch.setattr(LLM, "_token_tracker", tracker)
+    monkeypatch.setattr(LLM, "_hedging", hedging)
+    # Room for the hedge whatever the earlier tests used
+    monkeypatch.setattr(LLM, "_rate_limiter", RateLimiter(requests_per_minute=1000, tokens_per_minute=10 ** 6))
+    monkeypatch.setattr(tracker, "count_tokens", lambda text, model: len(text.split()))
+
+    assert llm.inference("hedge me", None) == "echo: hedge me"
+    assert FakeAzureOpenAI.calls == 2
+    abandoned, answered = list(tracker.usage["calls"])[-2:]
+    assert (abandoned["input_tokens"], abandoned["output_tokens"], abandoned["reported"]) == (2, 0, False)
+    assert (answered["input_tokens"], answered["output_tokens"], answered["reported"]) == (7, 3, True)
+
+
+def test_database_io_runs_off_the_shared_loop(llm, monkeypatch):
+    from src.llm.event_loop import background_loop
+    threads = []
+
+    class RecordingCache:
+        key = staticmethod(LLM._cache.key)
+
+        def get(self, key):
+            threads.append(threading.current_thread())
+
+        def put(self, key, model, response):
+            threads.append(threading.current_thread())
+
+    monkeypatch.setattr(LLM, "_cache", RecordingCache())
+    monkeypatch.setattr(LLM, "update_global_token_usage",
+                        staticmethod(lambda *args: threads.append(threading.current_thread())))
+    llm.use_cache = True
+
+    assert llm.inference("stored", "project") == "echo: stored"
+    assert len(threads) == 3
+    assert background_loop()._thread not in threads
@@ -0,0 +1,51 @@
+import pytest
+from src.llm.cache import ResponseCache, cache_key
+from src.storage.engine import sqlite_url
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    # Never touch the caches persisted in the configured database
+    return sqlite_url(str(tmp_path / "cache.sqlite"))
+
+
+@pytest.fixture
+def cache(db_url):
+    return ResponseCache(max_items=3, max_bytes=1024, ttl=60, persistent=True, url=db_url)
+
+
+def test_cache_key_covers_model_prompt_and_params():
+    key = cache_key("gpt-4o", "hello", {"temperature": 0})
+    assert key == cache_key("gpt-4o", "hello", {"temperature": 0})
+    assert key != cache_key("gpt-4o", "hello", {"temperature": 0.7})
+    assert key != cache_key("gpt-4", "hello", {"temperature": 0})
+    assert len(key) == 64
+
+
+def test_memory_tier_is_bounded(cache):
+    for i in range(4):
+        cache.put(cache_key("m", str(i)), "m", f"response {i}")
+    assert cache.stats()["entries"] == 3
+
+    cache.put(cache_key("m", "big"), "m", "x" * 1000)
+    assert cache.stats()["bytes"] <= 1024
+
+
+def test_persistent_tier_survives_a_new_cache(cache, db_url):
+    key = cache_key("m", "prompt")
+    cache.put(key, "m", "answer")
+    assert cache.get(key) == "answer"
+
+    restarted = ResponseCache(ttl=60, persistent=True, url=db_url)
+    assert restarted.get(key) == "answer"
+    assert restarted.stats()["disk_hits"] == 1
+    assert restarted.get(cache_key("m", "other")) is None
+    assert restarted.stats()["hit_rate"] == 0.5
+
+
+def test_expired_entries_are_misses(cache, db_url):
+    expired = ResponseCache(ttl=-1, persistent=True, url=db_url)
+    key = cache_key("m", "stale")
+    expired.put(key, "m", "old")
+    assert expired.get(key) is None
+    assert cache.get(key) is None
@@ -48,4 +48,102 @@ def test_delete_project(pm):
     project_name = "Test Project"
     pm.create_project(project_name)
     pm.delete_project(project_name)
-    assert project_name not in pm.get_all_projects() 
\ No newline at end of file
+    assert project_name not in pm.get_all_projects() 
+
+def test_get_messages_paginated(pm):
+    project_name = "Paged Project"
+    pm.delete_project(project_name)
+    pm.create_project(project_name)
+    for i in range(5):
+        pm.add_message_from_user(project_name, f"Message {i}")
+    assert [m["message"] for m in pm.get_messages(project_name, limit=2)] == ["Message 3", "Message 4"]
+    first_seq = pm.get_messages(project_name)[0]["seq"]
+    page = pm.get_messages(project_name, since=first_seq, limit=2)
+    assert [m["message"] for m in page] == ["Message 1", "Message 2"]
+    pm.delete_project(project_name)
+
+def test_latest_message_lookups(pm):
+    project_name = "Latest Project"
+    pm.delete_project(project_name)
+    pm.create_project(project_name)
+    pm.add_message_from_user(project_name, "Question")
+    assert pm.validate_last_message_is_from_user(project_name)
+    pm.add_message_from_agent(project_name, "Answer")
+    assert not pm.validate_last_message_is_from_user(project_name)
+    assert pm.get_latest_message_from_user(project_name)["message"] == "Question"
+    assert pm.get_latest_message_from_agent(project_name)["message"] == "Answer"
+    pm.delete_project(project_name)
+
+def test_project_manifest_and_file_content(pm):
+    import os
+    import shutil
+    directory = os.path.join("data", "projects", "Manifest-Project")
+    os.makedirs(os.path.join(directory, "node_modules"), exist_ok=True)
+    with open(os.path.join(directory, "main.py"), "w") as f:
+        f.write("print('hello')\n")
+    with open(os.path.join(directory, "node_modules", "lib.js"), "w") as f:
+        f.write("ignored")
+    try:
+        manifest = pm.get_project_manifest("Manifest Project")
+        assert [entry["file"] for entry in manifest["files"]] == ["main.py"]
+        content = pm.read_project_file("Manifest Project", "main.py")
+        assert content["code"] == "print('hello')\n"
+        assert content["hash"] == manifest["files"][0]["hash"]
+        assert pm.read_project_file("Manifest Project", "../../../config.yaml") is None
+        assert pm.read_project_file("Manifest Project", "node_modules/lib.js") is None
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_project_archive_streamed_and_cached(pm):
+    import io
+    import os
+    import shutil
+    import zipfile
+    directory = os.path.join("data", "projects", "archive-project")
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "main.py"), "w") as f:
+        f.write("print('hello')\n" * 100)
+    with open(os.path.join(directory, "logo.png"), "wb") as f:
+        f.write(b"\x89PNG" + bytes(range(256)) * 4)
+    try:
+        assert pm.get_cached_archive("Archive Project")[0] is None
+        data = b"".join(pm.stream_project_zip("Archive Project"))
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            infos = {info.filename: info for info in archive.infolist()}
+            assert archive.read("archive-project/main.py") == b"print('hello')\n" * 100
+        assert infos["archive-project/main.py"].compress_type == zipfile.ZIP_DEFLATED
+        assert infos["archive-project/logo.png"].compress_type == zipfile.ZIP_STORED
+
+        cached_path, digest = pm.get_cached_archive("Archive Project")
+        with open(cached_path, "rb") as f:
+            assert f.read() == data
+
+        with open(os.path.join(directory, "main.py"), "a") as f:
+            f.write("print('changed')\n")
+        assert pm.get_cached_archive("Archive Project")[1] != digest
+        assert pm.get_cached_archive("Archive Project")[0] is None
+    finally:
+        shutil.rmtree(directory)
+        shutil.rmtree(os.path.join("data", "archives"), ignore_errors=True)
+
+
+def test_file_hash_cache_is_bounded_and_dropped_with_project(pm):
+    import os
+    import shutil
+    directory = os.path.join("data", "projects", "Hash-Project")
+    os.makedirs(directory, exist_ok=True)
+    for name in ("a.py", "b.py", "c.py"):
+        with open(os.path.join(directory, name), "w") as f:
+            f.write(f"# {name}\n")
+    pm.hash_cache_size = 2
+    try:
+        pm.get_project_manifest("Hash Project")
+        cached = [path for path in ProjectManager._file_hashes if path.startswith(os.path.abspath(directory))]
+        assert [os.path.basename(path) for path in cached] == ["b.py", "c.py"]
+        assert len(ProjectManager._file_hashes) <= 2
+
+        pm.delete_project("Hash Project")
+        assert not any(path.startswith(os.path.abspath(directory)) for path in ProjectManager._file_hashes)
+    finally:
+        shutil.rmtree(directory)
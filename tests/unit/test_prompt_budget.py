@@ -0,0 +1,64 @@
+from src.prompts.prompt_budget import PromptBudget
+
+
+class WordEncoding:
+    """One token per whitespace-separated word."""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, text):
+        self.encoded.append(text)
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+def budget(**budgets):
+    return PromptBudget("test", budgets, min_elided_tokens=5, encoding=WordEncoding())
+
+
+def test_keeps_newest_messages_in_order():
+    prompt_budget = budget(conversation=6)
+    messages = ["User: one two three", "Agent: four five", "User: six seven"]
+    assert prompt_budget.fit_messages("conversation", messages) == messages[1:]
+    assert prompt_budget.dropped == {"conversation": 4}
+
+
+def test_oversized_latest_message_is_elided():
+    prompt_budget = budget(conversation=4)
+    kept = prompt_budget.fit_messages("conversation", ["User: " + " ".join(str(i) for i in range(20))])
+    assert len(kept) == 1
+    assert kept[0].startswith("User: 0") and kept[0].endswith("19")
+    assert "tokens elided" in kept[0]
+    # Counting and eliding share one encoding of the message
+    assert len(prompt_budget.encoding.encoded) == 1
+
+
+def test_code_prioritizes_error_referenced_then_recent_files():
+    prompt_budget = budget(code_markdown=40)
+    files = [
+        {"filename": "/p/old.py", "code": "a " * 10, "mtime": 1},
+        {"filename": "/p/new.py", "code": "b " * 10, "mtime": 3},
+        {"filename": "/p/broken.py", "code": "c " * 10, "mtime": 2},
+    ]
+    markdown = prompt_budget.fit_code("code_markdown", files, error='File "/p/broken.py", line 3')
+    assert markdown.index("broken.py") < markdown.index("new.py")
+    assert "Files left out to fit the context: /p/old.py" in markdown
+    assert prompt_budget.dropped["code_markdown"] >= 10
+
+
+def test_long_file_middle_is_elided():
+    prompt_budget = budget(code_markdown=30)
+    code = " ".join(f"line{i}" for i in range(100))
+    markdown = prompt_budget.fit_code("code_markdown", [{"filename": "/p/big.py", "code": code}])
+    assert "line0" in markdown and "line99" in markdown and "line50" not in markdown
+    assert "tokens elided" in markdown
+
+
+def test_no_budget_means_no_truncation():
+    prompt_budget = budget()
+    messages = ["User: " + "word " * 1000]
+    assert prompt_budget.fit_messages("conversation", messages) == messages
+    assert prompt_budget.dropped == {}
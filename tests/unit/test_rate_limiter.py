@@ -0,0 +1,47 @@
+import asyncio
+from src.llm.rate_limiter import RateLimiter, TokenBucket
+
+
+def test_burst_then_wait_for_requests():
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=10**6, burst_size=3)
+    assert [limiter.reserve("m") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert 0.9 < limiter.reserve("m") <= 1.0
+    # A different model has its own buckets
+    assert limiter.reserve("other") == 0.0
+
+
+def test_callers_are_served_in_arrival_order():
+    bucket = TokenBucket(rate=1, capacity=1)
+    bucket.updated = 0.0
+    waits = [bucket.reserve(1, now=0.0) for _ in range(4)]
+    assert waits == [0.0, 1.0, 2.0, 3.0]
+
+
+def test_tokens_per_minute_and_settle():
+    limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=600, burst_size=100)
+    assert limiter.reserve("m", tokens=600) == 0.0
+    assert limiter.reserve("m", tokens=60) > 5
+    limiter.settle("m", 600, 0)
+    assert limiter.reserve("m", tokens=60) == 0.0
+
+
+def test_disabled_limiter_never_waits():
+    limiter = RateLimiter(requests_per_minute=1, burst_size=1, enabled=False)
+    assert all(limiter.reserve("m", 10**9) == 0.0 for _ in range(5))
+
+
+def test_queue_depth_and_cancel():
+    limiter = RateLimiter(requests_per_minute=60, burst_size=1)
+
+    async def scenario():
+        await limiter.acquire("m")
+        waiter = asyncio.ensure_future(limiter.acquire("m"))
+        await asyncio.sleep(0.01)
+        assert limiter.queue_depth("m") == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert limiter.queue_depth("m") == 0
+
+    asyncio.run(scenario())
+    # The cancelled reservation was returned to the bucket
+    assert limiter.reserve("m") < 1.0
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.browser.search_cache import SearchCache
+from src.storage.engine import sqlite_url
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    # Never touch the search results persisted in the configured database
+    return sqlite_url(str(tmp_path / "cache.sqlite"))
+
+
+@pytest.fixture
+def cache(db_url):
+    return SearchCache(max_items=2, ttl=60, persistent=True, url=db_url)
+
+
+def results(query):
+    return [{"title": query, "link": f"https://example.com/{query}", "snippet": ""}]
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SearchCache(max_items=2, persistent=False)
+    for query in ("a", "b"):
+        cache.set(("duckduckgo", query, 5), results(query))
+    cache.get(("duckduckgo", "a", 5))
+    cache.set(("duckduckgo", "c", 5), results("c"))
+
+    assert cache.get(("duckduckgo", "a", 5)) == results("a")
+    assert cache.get(("duckduckgo", "b", 5)) is None
+    assert cache.stats()["entries"] == 2
+
+
+def test_expired_entries_are_misses(db_url):
+    clock = Clock()
+    cache = SearchCache(ttl=10, persistent=True, url=db_url, clock=clock)
+    cache.set(("duckduckgo", "q", 5), results("q"))
+    clock.now += 11
+    assert cache.get(("duckduckgo", "q", 5)) is None
+    assert cache.stats()["disk_hits"] == 0
+
+
+def test_persistent_tier_survives_a_new_cache(cache, db_url):
+    key = ("duckduckgo", "query", 5)
+    cache.set(key, results("q"))
+
+    restarted = SearchCache(ttl=60, persistent=True, url=db_url)
+    assert restarted.get(key) == results("q")
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_usable_from_several_threads_and_event_loops():
+    cache = SearchCache(max_items=100, persistent=False)
+
+    async def fill(index):
+        cache.set(("duckduckgo", str(index), 5), results(str(index)))
+        return cache.get(("duckduckgo", str(index), 5))
+
+    found = []
+    threads = [threading.Thread(target=lambda i=i: found.append(asyncio.run(fill(i)))) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(found, key=lambda r: r[0]["title"]) == [results(str(i)) for i in range(8)]
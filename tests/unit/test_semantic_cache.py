@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from src.llm.semantic_cache import SemanticCache
+
+VECTORS = {
+    "how do I run the tests?": [1.0, 0.0, 0.0],
+    "how can I run the tests": [0.98, 0.2, 0.0],
+    "deploy the app": [0.0, 0.0, 1.0],
+}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def cache(clock):
+    return SemanticCache(threshold=0.95, max_entries=3, ttl=60, embed=lambda text: np.array(VECTORS[text]), clock=clock)
+
+
+def test_similar_key_hits_and_dissimilar_misses(cache):
+    namespace = cache.namespace("gpt-4o", "answer", "Q: how do I run the tests?", "how do I run the tests?")
+    cache.put(namespace, cache.embed("how do I run the tests?"), "pytest -q")
+
+    assert cache.get(namespace, cache.embed("how can I run the tests"), "answer") == "pytest -q"
+    assert cache.get(namespace, cache.embed("deploy the app"), "answer") is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert 0.95 <= stats["mean_hit_similarity"] < 1.0
+
+
+def test_namespace_requires_the_rest_of_the_prompt_to_match(cache):
+    key = "how do I run the tests?"
+    same = cache.namespace("gpt-4o", "answer", f"Context: A\nQ: {key}", key)
+
+    assert cache.namespace("gpt-4o", "answer", f"Context: A\nQ: {key}", key) == same
+    assert cache.namespace("gpt-4o", "answer", f"Context: B\nQ: {key}", key) != same
+    assert cache.namespace("gpt-4o", "decision", f"Context: A\nQ: {key}", key) != same
+    assert cache.namespace("gpt-4o", "answer", "Q: something else", key) is None
+
+
+def test_entries_are_bounded_and_expire(cache, clock):
+    vector = cache.embed("deploy the app")
+    for index in range(5):
+        cache.put(f"ns{index}", vector, "done")
+    assert cache.stats()["entries"] == 3
+    assert cache.get("ns0", vector) is None
+    assert cache.get("ns4", vector) == "done"
+
+    clock.now += 61
+    assert cache.get("ns4", vector) is None
+    assert cache.stats()["entries"] == 2
+
+
+def test_failed_embedding_is_skipped():
+    cache = SemanticCache(embed=lambda text: np.array([]))
+    assert cache.embed("anything") is None
+    assert not SemanticCache(enabled=False).enabled_for("answer")
+    assert not cache.enabled_for("coder")
@@ -0,0 +1,35 @@
+from src.storage import get_engine, session_factory
+from src.state import AgentState
+from src.project import ProjectManager
+
+def test_engine_is_shared():
+    assert get_engine() is get_engine()
+    assert AgentState().engine is ProjectManager().engine
+
+def test_session_factory_is_bound_to_shared_engine():
+    with session_factory()() as session:
+        assert session.get_bind() is get_engine()
+
+def test_concurrent_writes_are_group_committed():
+    import threading
+    from src.storage import get_writer
+    sm = AgentState()
+    project_name = "Group Commit Project"
+    sm.create_state(project_name)
+    writer = get_writer()
+    batches_before, operations_before = writer.batches, writer.operations
+
+    def append_states():
+        for _ in range(10):
+            sm.update_token_usage(project_name, 1)
+
+    threads = [threading.Thread(target=append_states) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sm.get_latest_token_usage(project_name) == 40
+    assert writer.operations - operations_before == 40
+    assert writer.batches - batches_before <= 40
+    sm.delete_state(project_name)
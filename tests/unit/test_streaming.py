@@ -0,0 +1,27 @@
+import src.llm.streaming as streaming
+from src.llm.streaming import StreamPublisher
+
+
+def test_publisher_throttles_and_tracks_offsets(monkeypatch):
+    emitted = []
+    monkeypatch.setattr(streaming, "emit_agent", lambda channel, content, log=True: emitted.append(content))
+
+    publisher = StreamPublisher("proj", "gpt-4o", interval=60)
+    for chunk in ["Hel", "lo", " world"]:
+        publisher.push(chunk)
+    publisher.close()
+
+    # The first chunk goes out right away, the rest is held until close()
+    assert [(m["offset"], m["delta"], m["done"]) for m in emitted] == [(0, "Hel", False), (3, "lo world", True)]
+    assert {m["stream_id"] for m in emitted} == {publisher.stream_id}
+    assert publisher.first_token_at is not None
+
+
+def test_publisher_without_project_emits_nothing(monkeypatch):
+    emitted = []
+    monkeypatch.setattr(streaming, "emit_agent", lambda *args, **kwargs: emitted.append(args))
+
+    publisher = StreamPublisher(None, "gpt-4o", interval=0)
+    publisher.push("text")
+    publisher.close()
+    assert emitted == []
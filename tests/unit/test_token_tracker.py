@@ -0,0 +1,35 @@
+from src.utils.token_tracker import TokenTracker
+
+
+class CountingEncoder:
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, text):
+        self.calls += 1
+        return text.split()
+
+
+def tracker_with_encoder():
+    tracker = TokenTracker()
+    encoder = CountingEncoder()
+    tracker.encoders["gpt-4o"] = encoder
+    return tracker, encoder
+
+
+def test_repeated_texts_are_encoded_once():
+    tracker, encoder = tracker_with_encoder()
+    assert tracker.count_tokens("a long shared prompt", "gpt-4o") == 4
+    assert tracker.count_tokens("a long shared prompt", "gpt-4o") == 4
+    assert tracker.count_tokens("another prompt", "gpt-4o") == 2
+    assert encoder.calls == 2
+
+
+def test_reported_usage_wins_over_tokenizing():
+    tracker, encoder = tracker_with_encoder()
+    call = tracker.track_usage("gpt-4o", "prompt text", "response", usage={"prompt_tokens": 12, "completion_tokens": 5})
+    assert (call["input_tokens"], call["output_tokens"], call["total_tokens"]) == (12, 5, 17)
+    assert encoder.calls == 0
+
+    call = tracker.track_usage("gpt-4o", "prompt text", "the response")
+    assert (call["input_tokens"], call["output_tokens"], call["reported"]) == (2, 2, False)
@@ -0,0 +1,64 @@
+import time
+import uuid
+
+import pytest
+
+from src.utils.token_tracker import TokenTracker
+from src.utils.usage_ledger import UsageLedger
+
+
+@pytest.fixture
+def ledger():
+    ledger = UsageLedger(batch_size=100, flush_interval=60)
+    yield ledger
+    ledger.close()
+
+
+def test_calls_are_persisted_and_summarized_per_project(ledger):
+    project = f"ledger-{uuid.uuid4().hex}"
+    tracker = TokenTracker(ledger=ledger)
+    tracker.track_usage("gpt-4o", "", "", {"project_name": project}, usage={"prompt_tokens": 10, "completion_tokens": 5})
+    tracker.track_usage("duckduckgo", "", "", {"project_name": project, "type": "search"},
+                        usage={"prompt_tokens": 1, "completion_tokens": 2})
+
+    # Nothing is written until the batch fills, the interval passes or a summary is asked for
+    summary = ledger.summary(project=project)
+    assert (summary["calls"], summary["total_tokens"]) == (2, 18)
+    assert {(row["model"], row["kind"]) for row in summary["models"]} == {("gpt-4o", "llm"), ("duckduckgo", "search")}
+
+    # A restarted tracker still sees the recorded usage
+    assert UsageLedger(flush_interval=60).summary(project=project)["total_tokens"] == 18
+    assert ledger.summary(project=project, since=time.time() + 60)["calls"] == 0
+
+
+def test_in_memory_rollups_are_bounded(ledger):
+    tracker = TokenTracker(ledger=ledger)
+    tracker.max_projects = 2
+    for index in range(3):
+        tracker.track_usage("gpt-4o", "", "", {"project_name": f"p{index}"}, usage={"prompt_tokens": 1, "completion_tokens": 1})
+
+    summary = tracker.get_usage_summary()
+    assert list(summary["project_usage"]) == ["p1", "p2"]
+    assert summary["model_usage"]["gpt-4o"]["calls"] == 3
+    assert sum(hour["calls"] for hour in summary["hourly_usage"].values()) == 3
+    assert len(tracker.usage["calls"]) <= tracker.recent_calls
+
+
+def test_pending_records_are_bounded_when_writes_fail(monkeypatch):
+    ledger = UsageLedger(batch_size=100, flush_interval=60, max_pending=3)
+    project = f"ledger-{uuid.uuid4().hex}"
+    for tokens in range(4):
+        ledger.record("gpt-4o", project, "llm", tokens, 0, 0.0)
+    assert ledger.dropped == 1
+
+    def failing_write(operation):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr("src.utils.usage_ledger.run_write", failing_write)
+    ledger.flush()
+    ledger.record("gpt-4o", project, "llm", 4, 0, 0.0)
+    assert ledger.dropped == 2
+
+    monkeypatch.undo()
+    ledger.close()
+    assert ledger.summary(project=project)["input_tokens"] == 2 + 3 + 4
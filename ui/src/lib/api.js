@@ -126,12 +126,46 @@ export async function getBrowserSnapshot(snapshotPath) {
   return data.snapshot;
 }
 
+// Contents of project files already downloaded, keyed by project then path
+const projectFileCache = {};
+
 export async function fetchProjectFiles() {
   const projectName = localStorage.getItem("selectedProject");
-  const response = await fetch(`${API_BASE_URL}/api/get-project-files?project_name=${projectName}`)
-  const data = await response.json();
-  projectFiles.set(data.files);
-  return data.files;
+  const query = `project_name=${encodeURIComponent(projectName)}`;
+  const response = await fetch(`${API_BASE_URL}/api/project-manifest?${query}`);
+  const manifest = await response.json();
+
+  const cached = projectFileCache[projectName] || {};
+  const current = {};
+  await Promise.all(
+    manifest.files
+      .filter((entry) => !entry.binary)
+      .map(async (entry) => {
+        const known = cached[entry.file];
+        if (known && known.hash === entry.hash) {
+          current[entry.file] = known;
+          return;
+        }
+        // Only files whose content hash changed are downloaded
+        const fileResponse = await fetch(
+          `${API_BASE_URL}/api/project-file?${query}&file=${encodeURIComponent(entry.file)}`,
+          known ? { headers: { "If-None-Match": `"${known.hash}"` } } : {}
+        );
+        if (fileResponse.status === 304) {
+          current[entry.file] = known;
+        } else if (fileResponse.ok) {
+          const data = await fileResponse.json();
+          current[entry.file] = { hash: data.hash, code: data.code };
+        }
+      })
+  );
+  projectFileCache[projectName] = current;
+
+  const files = manifest.files
+    .filter((entry) => current[entry.file])
+    .map((entry) => ({ file: entry.file, code: current[entry.file].code }));
+  projectFiles.set(files);
+  return files;
 }
 
 export async function checkInternetStatus() {
@@ -1,10 +1,22 @@
 import { socket } from "./api";
-import { messages, agentState, isSending, tokenUsage } from "./store";
+import { messages, agentState, isSending, tokenUsage, selectedProject, streamingResponse } from "./store";
 import { toast } from "svelte-sonner";
 import { get } from "svelte/store";
 
 let prevMonologue = null;
 
+// Last applied agent-state sequence number per project, and projects
+// waiting for a snapshot after a missed delta.
+const lastSeq = {};
+const resyncing = new Set();
+
+function setLatestState(lastState) {
+  agentState.set(lastState);
+  if (lastState.completed) {
+    isSending.set(false);
+  }
+}
+
 export function initializeSockets() {
 
   socket.connect();
@@ -22,14 +34,49 @@ export function initializeSockets() {
     messages.update((msgs) => [...msgs, data["messages"]]);
   });
 
-  socket.on("agent-state", function (state) {
-    const lastState = state[state.length - 1];
-    agentState.set(lastState);
-    if (lastState.completed) {
-      isSending.set(false);
+  socket.on("agent-state-delta", function (delta) {
+    const last = lastSeq[delta.project];
+    if (last !== undefined) {
+      const expected = delta.op === "append" ? last + 1 : last;
+      if (delta.seq !== expected) {
+        // Missed an update: ask for a snapshot once and wait for it
+        if (!resyncing.has(delta.project)) {
+          resyncing.add(delta.project);
+          socket.emit("agent-state-resync", { project_name: delta.project, seq: last });
+        }
+        return;
+      }
+    }
+    lastSeq[delta.project] = delta.seq;
+    setLatestState(delta.entry);
+  });
+
+  socket.on("agent-state-snapshot", function (snapshot) {
+    resyncing.delete(snapshot.project);
+    lastSeq[snapshot.project] = snapshot.seq;
+    const entries = snapshot.state || [];
+    if (entries.length > 0) {
+      setLatestState(entries[entries.length - 1]);
     }
   });
 
+  socket.on("llm-stream", function (chunk) {
+    if (chunk.project_name !== get(selectedProject)) {
+      return;
+    }
+    streamingResponse.update((current) => {
+      if (chunk.done) {
+        return null;
+      }
+      const text = current?.stream_id === chunk.stream_id ? current.text : "";
+      if (chunk.offset !== text.length) {
+        // Missed a chunk: keep what we have, the final message follows anyway
+        return current;
+      }
+      return { stream_id: chunk.stream_id, text: text + chunk.delta };
+    });
+  });
+
   socket.on("tokens", function (tokens) {
     tokenUsage.set(tokens["token_usage"]);
   });
@@ -43,6 +90,14 @@ export function initializeSockets() {
     }
   });
 
+  socket.on("circuit-breaker", function (change) {
+    if (change.state === "open") {
+      toast.warning(`${change.backend} is unavailable, requests fail fast for ${change.retry_after}s`);
+    } else if (change.state === "closed") {
+      toast.info(`${change.backend} is available again`);
+    }
+  });
+
   socket.on("info", function (info) {
     if (info["type"] == "error") {
       toast.error(info["message"]);
@@ -76,10 +131,13 @@ export function destroySockets() {
   if (socket.connected) {
     socket.off("socket_response");
     socket.off("server-message");
-    socket.off("agent-state");
+    socket.off("agent-state-delta");
+    socket.off("agent-state-snapshot");
+    socket.off("llm-stream");
     socket.off("tokens");
     socket.off("inference");
     socket.off("info");
+    socket.off("circuit-breaker");
   }
 }
 
@@ -43,6 +43,8 @@ export const searchEngineList = writable([]);
 // Agent related stores
 export const agentState = writable(null);
 export const isSending = writable(false);
+// Partial text of the LLM response currently streaming for the selected project
+export const streamingResponse = writable(null);
 
 // Token usage store
 export const tokenUsage = writable(0);